@@ -0,0 +1,294 @@
+"""A local stand-in for a Lavalink v4 node.
+
+Speaks enough of the REST API and websocket protocol for mafic: track
+loading, player updates and destroys, session resuming and the player
+events. Tracks "play" on a clock sped up by ``speed`` and end with a
+TrackEndEvent, or now and then a TrackStuckEvent, so the bot's queue and
+autoplay logic runs the way it does against a real node. With
+``track_events=False`` it keeps player state but sends no track events, for
+replays that bring their own.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from aiohttp import WSMsgType, web
+
+from bench.fakes import track_data, track_number
+
+log = logging.getLogger("DopplerDeck.bench.lavalink")
+
+SEARCH_RESULTS = 5
+MIX_SIZE = 25
+PLAYLIST_SIZE = 150  # more than the 100 the play commands keep
+
+
+class _Player:
+    __slots__ = ("guild_id", "track", "paused", "volume", "position", "started", "end_handle", "voice")
+
+    def __init__(self, guild_id: str):
+        self.guild_id = guild_id
+        self.track: Optional[dict] = None
+        self.paused = False
+        self.volume = 100
+        self.position = 0  # ms, as of ``started``
+        self.started = 0.0
+        self.end_handle: Optional[asyncio.TimerHandle] = None
+        self.voice: dict = {}
+
+
+class FakeLavalink:
+    """``await start()`` on a free port, point a mafic node at ``host``/``port``"""
+
+    def __init__(self, *, host: str = "127.0.0.1", port: int = 0, password: str = "bench",
+                 speed: float = 100.0, rest_latency: float = 0.0, stuck_rate: float = 0.0, seed: int = 0,
+                 track_events: bool = True):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.speed = speed
+        self.rest_latency = rest_latency
+        self.stuck_rate = stuck_rate
+        self.track_events = track_events
+        self.session_id = os.urandom(8).hex()
+        self.players: Dict[str, _Player] = {}
+        self.requests: Dict[str, int] = {}
+        self.events: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._ws: Optional[web.WebSocketResponse] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._next_track = 0
+        self._thread: Optional[threading.Thread] = None
+        self._thread_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/version", self._version)
+        app.router.add_get("/v4/websocket", self._websocket)
+        app.router.add_get("/v4/loadtracks", self._load_tracks)
+        app.router.add_get("/v4/sessions/{session}/players", self._list_players)
+        app.router.add_patch("/v4/sessions/{session}", self._update_session)
+        app.router.add_patch("/v4/sessions/{session}/players/{guild}", self._update_player)
+        app.router.add_delete("/v4/sessions/{session}/players/{guild}", self._destroy_player)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start_in_thread(self):
+        """Serve from a loop on its own thread, so the node's CPU time isn't charged to the bot's"""
+        ready = threading.Event()
+
+        def serve():
+            loop = self._thread_loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+            loop.run_until_complete(self.close())
+            loop.close()
+
+        self._thread = threading.Thread(target=serve, name="fakelavalink", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop_thread(self):
+        if self._thread is not None:
+            self._thread_loop.call_soon_threadsafe(self._thread_loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    async def close(self):
+        for p in self.players.values():
+            if p.end_handle:
+                p.end_handle.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # -- REST --
+
+    async def _rest(self, request: web.Request, name: str):
+        if request.headers.get("Authorization") != self.password:
+            raise web.HTTPUnauthorized()
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+
+    async def _version(self, request: web.Request) -> web.Response:
+        return web.Response(text="4.0.0")
+
+    async def _load_tracks(self, request: web.Request) -> web.Response:
+        await self._rest(request, "loadtracks")
+        identifier = request.query.get("identifier", "")
+        if identifier.startswith(("ytsearch:", "scsearch:", "ytmsearch:")):
+            data = {"loadType": "search", "data": [track_data(self._track_for(identifier, i)) for i in range(SEARCH_RESULTS)]}
+        elif "list=" in identifier:
+            url = urlparse(identifier)
+            size = MIX_SIZE if parse_qs(url.query).get("list", [""])[0].startswith("RD") else PLAYLIST_SIZE
+            data = {
+                "loadType": "playlist",
+                "data": {
+                    "info": {"name": f"Playlist {zlib.crc32(identifier.encode()) % 10_000}", "selectedTrack": -1},
+                    "pluginInfo": {},
+                    "tracks": [track_data(self._track_for(identifier, i)) for i in range(size)],
+                },
+            }
+        elif identifier.startswith(("http://", "https://")):
+            data = {"loadType": "track", "data": track_data(self._track_for(identifier, 0))}
+        else:
+            data = {"loadType": "empty", "data": {}}
+        return web.json_response(data)
+
+    def _track_for(self, identifier: str, i: int) -> int:
+        # the same query returns the same tracks, like a real search would
+        return (zlib.crc32(identifier.encode()) % 1_000_000) * 1_000 + i
+
+    async def _list_players(self, request: web.Request) -> web.Response:
+        await self._rest(request, "players")
+        return web.json_response([self._payload(p) for p in self.players.values()])
+
+    async def _update_session(self, request: web.Request) -> web.Response:
+        await self._rest(request, "session")
+        body = await request.json()
+        return web.json_response({"resuming": bool(body.get("resuming")), "timeout": int(body.get("timeout", 60))})
+
+    async def _update_player(self, request: web.Request) -> web.Response:
+        await self._rest(request, "update")
+        gid = request.match_info["guild"]
+        body = await request.json()
+        p = self.players.get(gid)
+        if p is None:
+            p = self.players[gid] = _Player(gid)
+        if "voice" in body:
+            p.voice = body["voice"]
+            self._send({"op": "playerUpdate", "guildId": gid, "state": self._state(p)})
+        if "volume" in body:
+            p.volume = body["volume"]
+        if "paused" in body and body["paused"] != p.paused:
+            p.position = self._position(p)
+            p.started = time.monotonic()
+            p.paused = body["paused"]
+            if p.paused:
+                self._cancel_end(p)
+            else:
+                self._schedule_end(p)
+        if "encodedTrack" in body:
+            no_replace = request.query.get("noReplace", "False").lower() == "true"
+            if not (no_replace and p.track is not None):
+                self._set_track(p, body["encodedTrack"], body.get("position") or 0)
+        elif "position" in body and p.track is not None:
+            p.position = body["position"]
+            p.started = time.monotonic()
+            self._schedule_end(p)
+        return web.json_response(self._payload(p))
+
+    async def _destroy_player(self, request: web.Request) -> web.Response:
+        await self._rest(request, "destroy")
+        p = self.players.pop(request.match_info["guild"], None)
+        if p is not None:
+            self._cancel_end(p)
+        return web.Response(status=204)
+
+    # -- playback --
+
+    def _set_track(self, p: _Player, encoded: Optional[str], position: int):
+        previous = p.track
+        self._cancel_end(p)
+        p.track = track_data(track_number(encoded)) if encoded else None
+        p.position = position
+        p.started = time.monotonic()
+        if previous is not None:
+            self._event(p, "TrackEndEvent", previous, reason="replaced" if p.track else "stopped")
+        if p.track is not None:
+            self._event(p, "TrackStartEvent", p.track)
+            self._schedule_end(p)
+
+    def _schedule_end(self, p: _Player):
+        self._cancel_end(p)
+        if p.track is None or p.paused or not self.track_events:
+            return
+        info = p.track["info"]
+        # streams never end on their own, give them a few minutes of "air time"
+        length = info["length"] or 300_000
+        remaining = max(0.0, (length - self._position(p)) / 1000 / self.speed)
+        if self.stuck_rate and self._rng.random() < self.stuck_rate:
+            p.end_handle = asyncio.get_running_loop().call_later(remaining * self._rng.random(), self._stuck, p)
+        else:
+            p.end_handle = asyncio.get_running_loop().call_later(remaining, self._finish, p)
+
+    def _cancel_end(self, p: _Player):
+        if p.end_handle is not None:
+            p.end_handle.cancel()
+            p.end_handle = None
+
+    def _finish(self, p: _Player):
+        p.end_handle = None
+        track, p.track = p.track, None
+        if track is not None:
+            self._event(p, "TrackEndEvent", track, reason="finished")
+
+    def _stuck(self, p: _Player):
+        p.end_handle = None
+        if p.track is not None:
+            self._event(p, "TrackStuckEvent", p.track, thresholdMs=10_000)
+
+    def _position(self, p: _Player) -> int:
+        if p.track is None:
+            return 0
+        if p.paused:
+            return p.position
+        return p.position + int((time.monotonic() - p.started) * 1000 * self.speed)
+
+    def _state(self, p: _Player) -> dict:
+        return {"time": int(time.time() * 1000), "position": self._position(p), "connected": bool(p.voice), "ping": 1}
+
+    def _payload(self, p: _Player) -> dict:
+        track = None
+        if p.track is not None:
+            track = {**p.track, "info": {**p.track["info"], "position": self._position(p)}}
+        return {
+            "guildId": p.guild_id,
+            "track": track,
+            "volume": p.volume,
+            "paused": p.paused,
+            "state": self._state(p),
+            "voice": {"token": p.voice.get("token", ""), "endpoint": p.voice.get("endpoint", ""), "sessionId": p.voice.get("sessionId", "")},
+            "filters": {},
+        }
+
+    # -- websocket --
+
+    def _event(self, p: _Player, kind: str, track: dict, **extra):
+        if not self.track_events:
+            return
+        self.events[kind] = self.events.get(kind, 0) + 1
+        self._send({"op": "event", "type": kind, "guildId": p.guild_id, "track": track, **extra})
+
+    def _send(self, message: dict):
+        if self._ws is not None and not self._ws.closed:
+            asyncio.ensure_future(self._ws.send_str(json.dumps(message)))
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        if request.headers.get("Authorization") != self.password:
+            raise web.HTTPUnauthorized()
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        resumed = request.headers.get("Session-Id") == self.session_id
+        self._ws = ws
+        await ws.send_str(json.dumps({"op": "ready", "resumed": resumed, "sessionId": self.session_id}))
+        async for msg in ws:
+            if msg.type in (WSMsgType.CLOSE, WSMsgType.ERROR):
+                break
+        if self._ws is ws:
+            self._ws = None
+        return ws
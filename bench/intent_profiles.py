@@ -0,0 +1,131 @@
+"""RSS cost per 1k guilds for each gateway profile in gateway.py.
+
+Feeds synthetic GUILD_CREATE payloads (shaped the way Discord sends them for
+the profile's intents) into disnake's connection state, simulates member
+chunking when the profile enables it, and reports the RSS growth. Each profile
+runs in its own interpreter so the numbers don't bleed into each other.
+
+    python -m bench.intent_profiles --guilds 2000 --members 300
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+
+from metrics import rss_bytes
+
+ONLINE_RATIO = 0.3
+
+
+def _user(uid: int) -> dict:
+    return {"id": str(uid), "username": f"user{uid}", "discriminator": "0", "global_name": None, "avatar": None}
+
+
+def _member(uid: int) -> dict:
+    return {"user": _user(uid), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(gid: int, members: int, voice: int, intents) -> tuple[dict, list]:
+    """One GUILD_CREATE payload plus the member list a chunk request would return"""
+    base = gid * 10_000
+    user_ids = [base + i for i in range(1, members + 1)]
+    online = user_ids[: int(members * ONLINE_RATIO)]
+    in_voice = user_ids[:voice]
+    voice_channel = base + 9_001
+    channels = [{"id": str(base + 9_000 + i), "type": 2 if i == 1 else 0, "name": f"ch{i}", "position": i, "permission_overwrites": []} for i in range(20)]
+    roles = [{"id": str(base + 8_000 + i), "name": f"role{i}", "color": 0, "colors": {"primary_color": 0, "secondary_color": None, "tertiary_color": None}, "hoist": False, "position": i, "permissions": "0", "managed": False, "mentionable": False} for i in range(10)]
+    roles[0]["id"] = str(gid)  # @everyone
+
+    # without the members/presences intents Discord only sends the bot and voice members
+    sent = set(in_voice)
+    if intents.presences:
+        sent.update(online)
+    payload = {
+        "id": str(gid),
+        "name": f"guild {gid}",
+        "owner_id": str(user_ids[0]),
+        "member_count": members,
+        "large": members >= 250,
+        "roles": roles,
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "channels": channels,
+        "threads": [],
+        "members": [_member(uid) for uid in sorted(sent)],
+        "voice_states": [{"user_id": str(uid), "channel_id": str(voice_channel), "session_id": "x", "deaf": False, "mute": False, "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "request_to_speak_timestamp": None} for uid in in_voice],
+        "presences": [{"user": {"id": str(uid)}, "status": "online", "activities": [], "client_status": {"desktop": "online"}} for uid in online] if intents.presences else [],
+    }
+    chunk = [_member(uid) for uid in user_ids] if intents.members else []
+    return payload, chunk
+
+
+def run_profile(profile: str, guilds: int, members: int, voice: int) -> dict:
+    import disnake
+
+    from gateway import gateway_options
+
+    opts = gateway_options(profile)
+    client = disnake.Client(**opts)
+    state = client._connection
+    state.user = disnake.ClientUser(state=state, data={**_user(1), "bot": True, "verified": True, "mfa_enabled": False, "flags": 0})
+    gc.collect()
+    before = rss_bytes()
+
+    for i in range(guilds):
+        payload, chunk = guild_payload(1_000_000 + i, members, voice, opts["intents"])
+        guild = state._add_guild_from_data(payload)
+        if opts["chunk_guilds_at_startup"]:
+            for mdata in chunk:
+                guild._add_member(disnake.Member(data=mdata, guild=guild, state=state))
+
+    gc.collect()
+    after = rss_bytes()
+    cached_members = sum(len(g._members) for g in state._guilds.values())
+    return {
+        "profile": profile,
+        "guilds": guilds,
+        "cached_members": cached_members,
+        "rss_mb": round((after - before) / 2**20, 2),
+        "rss_mb_per_1k_guilds": round((after - before) / 2**20 / guilds * 1000, 2),
+    }
+
+
+def main():
+    from gateway import PROFILES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--members", type=int, default=300, help="members per guild")
+    parser.add_argument("--voice", type=int, default=5, help="members in voice per guild")
+    parser.add_argument("--profile", choices=PROFILES, help="run a single profile in this process")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.guilds, args.members, args.voice)))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for profile in PROFILES:
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.intent_profiles", "--profile", profile,
+             "--guilds", str(args.guilds), "--members", str(args.members), "--voice", str(args.voice)],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.guilds} guilds x {args.members} members ({args.voice} in voice)")
+    print(f"{'profile':<10}{'members cached':>16}{'RSS MB':>10}{'MB / 1k guilds':>16}")
+    for r in results:
+        print(f"{r['profile']:<10}{r['cached_members']:>16,}{r['rss_mb']:>10}{r['rss_mb_per_1k_guilds']:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""End-to-end load test of the Music cog against local Discord and Lavalink stand-ins.
+
+Every simulated guild has a listener in voice who keeps sending prefix
+commands (play, playlists, skip, queue, now playing, pause, stop, leave)
+through DopplerDeckBot.process_commands, while other listeners drop out of
+and back into voice. bench.fakelavalink plays the tracks on a sped-up clock,
+so track end, stuck and autoplay paths run too. Each guild count runs in its
+own interpreter and reports throughput, command latency and memory.
+
+    python -m bench.loadsim --guilds 100,1000,3000 --duration 60
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from metrics import rss_bytes
+
+# (operation, weight); "voice" is a listener leaving or rejoining rather than a command
+OPERATIONS = (
+    ("play", 40),
+    ("playlist", 3),
+    ("skip", 15),
+    ("queue", 10),
+    ("np", 10),
+    ("pause", 5),
+    ("stop", 3),
+    ("leave", 2),
+    ("voice", 12),
+)
+QUERY_VOCABULARY = 5_000
+GUILD_ID_BASE = 1_000_000
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class LoadSim:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.voice_events = 0
+        self._message_ids = itertools.count(10**15)
+        # search popularity is heavy tailed, which is what makes the search cache pay off
+        self._query_weights = [1 / (i + 1) ** 1.1 for i in range(QUERY_VOCABULARY)]
+
+    async def run(self) -> dict:
+        from bench.sim import add_guild, make_bot, start_lavalink
+        from loopmon import LoopMonitor
+        from music.commands import Music
+
+        args = self.args
+        gc.collect()
+        rss_start = rss_bytes()
+        bot, gateway, rest = make_bot(gateway_latency=args.gateway_latency, rest_latency=args.discord_latency)
+        bot.add_listener(self._on_command_error, "on_command_error")
+        guilds = [add_guild(bot, GUILD_ID_BASE + i, members=args.members, voice=args.voice) for i in range(args.guilds)]
+        server, node = await start_lavalink(bot, speed=args.speed, rest_latency=args.lavalink_latency, stuck_rate=args.stuck_rate, seed=args.seed)
+        music = Music(bot)
+        music.node = node
+        bot.add_cog(music)
+        gc.collect()
+        rss_loaded = rss_bytes()
+
+        monitor = LoopMonitor(interval=0.1, threshold=0.25)
+        monitor.start()
+        rss_peak = rss_loaded
+        started = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        sessions = [asyncio.create_task(self._session(bot, g, deadline)) for g in guilds]
+        while not all(t.done() for t in sessions):
+            await asyncio.sleep(1)
+            rss_peak = max(rss_peak, rss_bytes())
+        elapsed = time.perf_counter() - started
+        monitor.stop()
+        for t in sessions:
+            if t.exception():
+                raise t.exception()
+
+        players = len(music._players)
+        lag = monitor.summary()
+        bot.timers.close()
+        await node.close()
+        await server.close()
+
+        everything = [v for values in self.latencies.values() for v in values]
+        return {
+            "guilds": args.guilds,
+            "seconds": round(elapsed, 1),
+            "commands": len(everything),
+            "commands_per_second": round(len(everything) / elapsed, 1),
+            "p50_ms": round(percentile(everything, 0.5) * 1000, 2),
+            "p99_ms": round(percentile(everything, 0.99) * 1000, 2),
+            "per_command": {
+                op: {"count": len(v), "p50_ms": round(percentile(v, 0.5) * 1000, 2), "p99_ms": round(percentile(v, 0.99) * 1000, 2)}
+                for op, v in sorted(self.latencies.items())
+            },
+            "errors": self.errors,
+            "voice_events": self.voice_events,
+            "players_connected": players,
+            "lavalink_events": server.events,
+            "lavalink_requests": server.requests,
+            "discord_requests": sum(rest.calls.values()),
+            "loop_lag_p99_ms": round(lag["p99"] * 1000, 1),
+            "loop_lag_max_ms": round(lag["max"] * 1000, 1),
+            "rss_guilds_mb": round((rss_loaded - rss_start) / 2**20, 1),
+            "rss_peak_mb": round((rss_peak - rss_start) / 2**20, 1),
+            "rss_mb_per_1k_guilds": round((rss_peak - rss_start) / 2**20 / args.guilds * 1000, 2),
+        }
+
+    async def _session(self, bot, guild, deadline: float):
+        from bench.sim import listeners_in_voice, message_payload, text_channel_id, voice_channel_id, voice_state
+
+        import disnake
+
+        rng = random.Random(self.rng.random())
+        state = bot._connection
+        channel = guild.get_channel(text_channel_id(guild.id))
+        listeners = listeners_in_voice(guild.id, self.args.voice)
+        commander, others = listeners[0], listeners[1:]
+        away: set = set()
+        ops, weights = zip(*OPERATIONS)
+        # spread the first commands out so the run ramps up instead of starting with a burst
+        await asyncio.sleep(rng.uniform(0, self.args.think))
+        while time.monotonic() < deadline:
+            op = rng.choices(ops, weights)[0]
+            if op == "voice":
+                if others:
+                    uid = rng.choice(others)
+                    leaving = uid not in away
+                    (away.add if leaving else away.discard)(uid)
+                    state.parse_voice_state_update(voice_state(guild.id, uid, None if leaving else voice_channel_id(guild.id)))
+                    self.voice_events += 1
+            else:
+                content = self._content(op, rng)
+                msg = disnake.Message(state=state, channel=channel, data=message_payload(next(self._message_ids), guild.id, channel.id, commander, content))
+                t0 = time.perf_counter()
+                await bot.process_commands(msg)
+                self.latencies.setdefault(op, []).append(time.perf_counter() - t0)
+            await asyncio.sleep(rng.expovariate(1 / self.args.think))
+
+    def _content(self, op: str, rng: random.Random) -> str:
+        if op == "play":
+            return f">music play song {rng.choices(range(QUERY_VOCABULARY), self._query_weights)[0]}"
+        if op == "playlist":
+            return f">music play https://www.youtube.com/playlist?list=PL{rng.randrange(200):04d}"
+        if op == "queue":
+            return f">music queue {rng.randint(1, 3)}"
+        if op == "pause":
+            return ">music pause"
+        return f">music {op}"
+
+    async def _on_command_error(self, ctx, error):
+        name = type(getattr(error, "original", error)).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def run_in_process(args) -> dict:
+    logging.getLogger().setLevel(logging.ERROR)
+    return asyncio.run(LoadSim(args).run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", default="100,500,1000", help="guild counts to run, comma separated")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per guild count")
+    parser.add_argument("--think", type=float, default=5, help="mean seconds between a guild's commands")
+    parser.add_argument("--members", type=int, default=50, help="members per guild")
+    parser.add_argument("--voice", type=int, default=4, help="listeners in voice per guild")
+    parser.add_argument("--speed", type=float, default=60, help="how much faster than real time tracks play")
+    parser.add_argument("--stuck-rate", type=float, default=0.02, help="share of tracks that get stuck")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="seconds per Discord REST call")
+    parser.add_argument("--gateway-latency", type=float, default=0.05, help="seconds before Discord answers a voice join")
+    parser.add_argument("--lavalink-latency", type=float, default=0.01, help="seconds per Lavalink REST call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        args.guilds = int(args.guilds)
+        print(json.dumps(run_in_process(args)))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    passthrough = [a for a in sys.argv[1:] if a != "--json"]
+    results = []
+    for count in (int(c) for c in args.guilds.split(",") if c.strip()):
+        # separate interpreters so one run's heap doesn't inflate the next one's RSS
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.loadsim", *passthrough, "--guilds", str(count), "--single"],
+            cwd=root, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            sys.exit(f"Run with {count} guilds failed:\n{out.stderr[-4000:]}")
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        if not args.json:
+            print(f"{count} guilds done", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.duration:g}s per run, a command every ~{args.think:g}s per guild, tracks at {args.speed:g}x")
+    print(f"{'guilds':>7}{'cmds':>8}{'cmd/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'lag p99':>9}{'RSS MB':>9}{'MB/1k':>8}")
+    for r in results:
+        print(f"{r['guilds']:>7}{r['commands']:>8}{r['commands_per_second']:>8}{r['p50_ms']:>9}{r['p99_ms']:>9}"
+              f"{sum(r['errors'].values()):>8}{r['loop_lag_p99_ms']:>9}{r['rss_peak_mb']:>9}{r['rss_mb_per_1k_guilds']:>8}")
+    last = results[-1] if results else None
+    if last:
+        print(f"\nPer command at {last['guilds']} guilds:")
+        for op, s in last["per_command"].items():
+            print(f"  {op:<10}{s['count']:>8}  p50 {s['p50_ms']:>8} ms  p99 {s['p99_ms']:>8} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Offline microbenchmarks for the music hot paths, checked against a baseline.
+
+Runs the queue and now playing embeds, the formatting helpers and enqueueing
+against synthetic queues without Discord or Lavalink. Results are per call;
+with a saved baseline the run fails when a case gets slower than the
+threshold allows, so it can gate a change in CI.
+
+    python -m bench.music_hotpaths --save-baseline        # record on a known-good tree
+    python -m bench.music_hotpaths                        # compare, exit 1 on regression
+    python -m bench.music_hotpaths --sizes 10,1000 --threshold 0.5
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from bench.fakes import FakeGuild, attach_player, bare_music, make_tracks
+
+DEFAULT_SIZES = (10, 1_000, 10_000, 100_000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "music_hotpaths.json")
+PLAYLIST_SIZE = 100  # the play commands cap playlists at 100 tracks
+HELPER_BATCH = 1_000
+MIN_TIME = 0.2  # seconds each repeat should run for
+REPEATS = 5
+
+
+def measure(fn: Callable[[], object], min_time: float = MIN_TIME, repeats: int = REPEATS) -> float:
+    """Best seconds per call over ``repeats`` runs, each long enough to time reliably"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10 or number >= 1 << 20:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            best = min(best, (time.perf_counter() - started) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def cases(sizes: Tuple[int, ...]) -> Dict[str, Callable[[], object]]:
+    from music.commands import _fmt_ms, _source_name, _track_link_line
+
+    out: Dict[str, Callable[[], object]] = {}
+    helpers = make_tracks(HELPER_BATCH, start=10_000_000)
+    lengths = [t.length for t in helpers] + [None, 0, 3_600_000 * 3]
+    uris = [t.uri for t in helpers] + [None, ""]
+    out[f"_fmt_ms x{len(lengths)}"] = lambda: [_fmt_ms(ms) for ms in lengths]
+    out[f"_track_link_line x{len(helpers)}"] = lambda: [_track_link_line(t) for t in helpers]
+    out[f"_source_name x{len(uris)}"] = lambda: [_source_name(u) for u in uris]
+
+    playlist = make_tracks(PLAYLIST_SIZE, start=20_000_000)
+    for n in sizes:
+        music = bare_music()
+        guild = FakeGuild(n)
+        tracks = make_tracks(n + 1)
+        attach_player(music, guild, tracks[0], tracks[1:])
+        last_page = max(1, (n + 9) // 10)
+        out[f"_queue_embed first page n={n}"] = lambda m=music, g=guild: m._queue_embed(g, 1)
+        out[f"_queue_embed last page n={n}"] = lambda m=music, g=guild, p=last_page: m._queue_embed(g, p)
+        out[f"_now_playing_embed n={n}"] = lambda m=music, g=guild: m._now_playing_embed(g)
+        out[f"_now_playing_embed progress n={n}"] = lambda m=music, g=guild: m._now_playing_embed(g, progress=True)
+
+        def enqueue_all(m=music, g=guild, t=tracks[1:]):
+            m._queues.pop(g.id, None)
+            for track in t:
+                m._enqueue(g.id, track, 1)
+        out[f"_enqueue x{n}"] = enqueue_all
+
+        # a 100 track playlist landing on a queue that already holds n tracks
+        base = music._queues[guild.id].copy()
+
+        def enqueue_playlist(m=music, g=guild, base=base):
+            m._queues[g.id] = base.copy()
+            for track in playlist:
+                m._enqueue(g.id, track, 1)
+        out[f"playlist enqueue onto n={n}"] = enqueue_playlist
+    return out
+
+
+def run(sizes: Tuple[int, ...], only: str = "") -> Dict[str, float]:
+    results = {}
+    for name, fn in cases(sizes).items():
+        if only and only not in name:
+            continue
+        results[name] = measure(fn)
+        print(f"{name:<42}{_human(results[name]):>12}", file=sys.stderr)
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[Tuple[str, float, float, float]]:
+    """(case, baseline, now, ratio) for every case slower than ``1 + threshold`` times its baseline"""
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        ratio = now / before
+        if ratio > 1 + threshold:
+            regressions.append((name, before, now, ratio))
+    return regressions
+
+
+def _human(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="queue sizes, comma separated")
+    parser.add_argument("--only", default="", help="run cases whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    sizes = tuple(int(s) for s in args.sizes.split(",") if s.strip())
+    results = run(sizes, args.only)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        existing = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                existing = json.load(f).get("results", {})
+        existing.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": existing}, f, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} result(s) to {args.baseline}")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.json:
+        print(json.dumps({"results": results, "regressions": [r[0] for r in regressions]}, indent=2))
+    else:
+        print(f"{'case':<42}{'now':>12}{'baseline':>12}{'change':>10}")
+        for name, now in results.items():
+            before = baseline.get(name)
+            change = f"{(now / before - 1) * 100:+.0f}%" if before else "new"
+            print(f"{name:<42}{_human(now):>12}{_human(before) if before else '-':>12}{change:>10}")
+    if not baseline:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one.")
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed past {args.threshold:.0%}:")
+        for name, before, now, ratio in regressions:
+            print(f"  {name}: {_human(before)} -> {_human(now)} ({ratio:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
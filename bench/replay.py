@@ -0,0 +1,281 @@
+"""Replays a recording from ``>debug record`` and measures what the handlers cost.
+
+Gateway events go through the connection state's parsers and Lavalink
+messages through the mafic node, into a DopplerDeckBot with the Music and
+Utils cogs, against the same Discord stand-ins as bench.loadsim and a
+passive bench.fakelavalink that leaves track events to the recording. CPU
+time (and with --trace-allocations, allocated memory) is charged to the
+event that caused it, including every task it spawned, so two builds can be
+compared on a real traffic shape.
+
+    python -m bench.replay recordings/events-20240101-120000.jsonl.gz --save-baseline
+    python -m bench.replay recordings/events-20240101-120000.jsonl.gz --speed 10
+"""
+import argparse
+import asyncio
+import contextvars
+import gzip
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+MIN_EVENTS = 20  # fewer samples than this are too noisy to gate on
+TOP_ALLOCATORS = 10
+
+# the recorded event whose handling is running; tasks inherit it, so spawned work is charged to it too
+CURRENT_EVENT: contextvars.ContextVar = contextvars.ContextVar("replay_event", default=None)
+
+
+def read_recording(path: str) -> Tuple[dict, List[list]]:
+    """(header, [[offset, kind, name, data], ...]) in recorded order"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        events = [json.loads(line) for line in f if line.strip()]
+    # flushes can interleave with the guild snapshot, keep it first
+    events.sort(key=lambda e: e[0])
+    return header, events
+
+
+class Meter:
+    """Charges event loop CPU time and allocations to the recorded event that caused them"""
+
+    def __init__(self, allocations: bool):
+        self.allocations = allocations
+        self.cpu: Dict[str, float] = {}
+        self.alloc: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+        self._original_run = None
+
+    def install(self):
+        handle_cls = asyncio.events.Handle
+        self._original_run = original = handle_cls._run
+        meter = self
+
+        def _run(handle):
+            kind = handle._context.get(CURRENT_EVENT)
+            if kind is None:
+                return original(handle)
+            return meter.charge(kind, original, handle)
+        handle_cls._run = _run
+
+    def uninstall(self):
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    def charge(self, kind: str, fn, *args):
+        t0 = time.thread_time()
+        m0 = tracemalloc.get_traced_memory()[0] if self.allocations else 0
+        try:
+            return fn(*args)
+        finally:
+            self.cpu[kind] = self.cpu.get(kind, 0.0) + time.thread_time() - t0
+            if self.allocations:
+                self.alloc[kind] = self.alloc.get(kind, 0) + tracemalloc.get_traced_memory()[0] - m0
+
+
+class Replay:
+    def __init__(self, args):
+        self.args = args
+        self.errors: Dict[str, int] = {}
+        self.meter = Meter(args.trace_allocations)
+
+    async def run(self) -> dict:
+        from bench.sim import make_bot, start_lavalink
+        from music.commands import Music
+        from utils.commands import Utils
+
+        args = self.args
+        header, events = read_recording(args.recording)
+        bot, gateway, rest = make_bot(args.profile)
+        bot.command_prefix = header.get("prefix", ">")
+        bot.add_listener(self._on_command_error, "on_command_error")
+        server, node = await start_lavalink(bot, threaded=True, track_events=False)
+        music = Music(bot)
+        music.node = node
+        bot.add_cog(music)
+        bot.add_cog(Utils(bot))
+
+        state = bot._connection
+        if args.trace_allocations:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        self.meter.install()
+        cpu_start = time.thread_time()
+        started = time.perf_counter()
+        try:
+            for at, kind, name, data in events:
+                if args.speed > 0:
+                    delay = started + at / args.speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+                if kind == "l" and name == "ready":
+                    continue  # the node is already connected to the fake, a recorded reconnect would reset it
+                label = self._label(bot, kind, name, data)
+                self.meter.counts[label] = self.meter.counts.get(label, 0) + 1
+                ctx = contextvars.copy_context()
+                ctx.run(CURRENT_EVENT.set, label)
+                if kind == "l":
+                    ctx.run(self.meter.charge, label, asyncio.ensure_future, node._handle_msg(data))
+                elif name == "GUILD_CREATE":
+                    # the real parser would ask the gateway to chunk members first
+                    ctx.run(self.meter.charge, label, state._add_guild_from_data, data)
+                else:
+                    ctx.run(self.meter.charge, label, state.parsers[name], data)
+            # let the last commands and the work they spawned finish
+            await asyncio.sleep(args.settle)
+            elapsed = time.perf_counter() - started
+            cpu_total = time.thread_time() - cpu_start
+        finally:
+            self.meter.uninstall()
+
+        top = []
+        if args.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+            tracemalloc.stop()
+            top = [(f"{d.traceback[0].filename.rsplit('/', 1)[-1]}:{d.traceback[0].lineno}", d.size_diff) for d in diff[:TOP_ALLOCATORS]]
+
+        bot.timers.close()
+        await node.close()
+        server.stop_thread()
+
+        counts = self.meter.counts
+        result = {
+            "recording": os.path.basename(args.recording),
+            "events": len(events),
+            "recorded_seconds": round(events[-1][0], 1) if events else 0.0,
+            "seconds": round(elapsed, 1),
+            "speed": args.speed,
+            "cpu_total_ms": round(cpu_total * 1000, 1),
+            "cpu_unattributed_ms": round((cpu_total - sum(self.meter.cpu.values())) * 1000, 1),
+            "per_event": {
+                label: {"count": n, "cpu_us": round(self.meter.cpu.get(label, 0.0) / n * 1e6, 1)}
+                for label, n in sorted(counts.items())
+            },
+            "errors": self.errors,
+            "discord_requests": sum(rest.calls.values()),
+            "lavalink_requests": sum(server.requests.values()),
+        }
+        if args.trace_allocations:
+            for label, n in counts.items():
+                result["per_event"][label]["alloc_kb"] = round(self.meter.alloc.get(label, 0) / n / 1024, 2)
+            result["traced_mb"] = round(current / 2**20, 1)
+            result["traced_peak_mb"] = round(peak / 2**20, 1)
+            result["top_growth"] = top
+        return result
+
+    def _label(self, bot, kind: str, name: str, data: dict) -> str:
+        if kind == "l":
+            return f"lavalink {data.get('type') or name}"
+        if name == "MESSAGE_CREATE":
+            content = data.get("content") or ""
+            if content.startswith(bot.command_prefix):
+                words = content[len(bot.command_prefix):].split()
+                # longest run of words that names a command, so subcommands get their own line
+                for i in range(len(words), 0, -1):
+                    cmd = bot.get_command(" ".join(words[:i]))
+                    if cmd is not None:
+                        return f"{name} {cmd.qualified_name}"
+        if name == "INTERACTION_CREATE":
+            command = (data.get("data") or {}).get("name")
+            if command:
+                return f"{name} /{command}"
+        return name
+
+    async def _on_command_error(self, ctx, error):
+        name = type(getattr(error, "original", error)).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> List[Tuple[str, float, float, float]]:
+    """(what, baseline, now, ratio) for the total and every well sampled event that got more expensive"""
+    pairs = [("cpu total ms", baseline.get("cpu_total_ms"), result["cpu_total_ms"])]
+    for label, now in result["per_event"].items():
+        before = baseline.get("per_event", {}).get(label)
+        if not before or now["count"] < MIN_EVENTS:
+            continue
+        pairs.append((f"{label} cpu µs", before["cpu_us"], now["cpu_us"]))
+        if "alloc_kb" in now and before.get("alloc_kb", 0) > 0:
+            pairs.append((f"{label} alloc KB", before["alloc_kb"], now["alloc_kb"]))
+    regressions = []
+    for what, before, now in pairs:
+        if before and now / before > 1 + threshold:
+            regressions.append((what, before, now, now / before))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="file written by >debug record")
+    parser.add_argument("--speed", type=float, default=0, help="1 replays in real time, 10 ten times faster, 0 as fast as possible")
+    parser.add_argument("--settle", type=float, default=2, help="seconds to let work finish after the last event")
+    parser.add_argument("--profile", default="music", help="gateway profile the bot is built with")
+    parser.add_argument("--trace-allocations", action="store_true", help="also charge allocated memory to events (slower)")
+    parser.add_argument("--baseline", help="defaults to bench/baselines/replay-<recording>.json")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    stem = os.path.basename(args.recording).split(".", 1)[0]
+    args.baseline = args.baseline or os.path.join(BASELINE_DIR, f"replay-{stem}.json")
+
+    logging.getLogger().setLevel(logging.ERROR)
+    # player updates recorded before a player existed in the recording's own timeline are expected noise
+    logging.getLogger("mafic").setLevel(logging.CRITICAL)
+    result = asyncio.run(Replay(args).run())
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "result": result}, f, indent=2, sort_keys=True)
+        print(f"Saved replay of {result['events']} events to {args.baseline}")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("result", {})
+    regressions = compare(result, baseline, args.threshold)
+    if baseline and baseline.get("speed") != args.speed:
+        print(f"Baseline was replayed at --speed {baseline.get('speed')}, timings are not comparable.", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps({"result": result, "regressions": [r[0] for r in regressions]}, indent=2))
+    else:
+        print(f"{result['events']} events over {result['recorded_seconds']}s recorded, replayed in {result['seconds']}s")
+        total_before = baseline.get("cpu_total_ms")
+        print(f"CPU {result['cpu_total_ms']} ms" + (f" (baseline {total_before} ms)" if total_before else "")
+              + f", {result['cpu_unattributed_ms']} ms not tied to an event")
+        alloc = args.trace_allocations
+        print(f"\n{'event':<36}{'count':>8}{'cpu µs':>10}{'baseline':>10}{'change':>9}" + (f"{'alloc KB':>10}" if alloc else ""))
+        for label, now in result["per_event"].items():
+            before = baseline.get("per_event", {}).get(label)
+            change = f"{(now['cpu_us'] / before['cpu_us'] - 1) * 100:+.0f}%" if before and before["cpu_us"] else "new"
+            print(f"{label[:35]:<36}{now['count']:>8}{now['cpu_us']:>10}{before['cpu_us'] if before else '-':>10}{change:>9}"
+                  + (f"{now['alloc_kb']:>10}" if alloc else ""))
+        if result["errors"]:
+            print("\nCommand errors: " + ", ".join(f"{k} {v}" for k, v in result["errors"].items()))
+        if alloc:
+            print(f"\nTraced {result['traced_mb']} MB at the end, peak {result['traced_peak_mb']} MB. Largest growth:")
+            for where, size in result["top_growth"]:
+                print(f"  {size / 1024:>+10.0f} KB  {where}")
+    if not baseline:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one.")
+    if regressions:
+        print(f"\n{len(regressions)} measurement(s) regressed past {args.threshold:.0%}:")
+        for what, before, now, ratio in regressions:
+            print(f"  {what}: {before} -> {now} ({ratio:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""A DopplerDeckBot wired to stand-ins for the Discord gateway and REST API.
+
+Guilds are loaded from synthetic GUILD_CREATE payloads into the real
+connection state, voice joins are answered with the VOICE_STATE_UPDATE /
+VOICE_SERVER_UPDATE pair Discord would send, and REST calls (message sends,
+edits, member edits) return canned payloads after a configurable delay. The
+Music cog talks to a mafic node pointed at ``bench.fakelavalink``.
+"""
+import asyncio
+import itertools
+import os
+from typing import Dict, Optional
+
+import disnake
+from disnake.ext import commands
+
+from bench.fakes import FakeRestrictionDB
+from bench.intent_profiles import _member, _user, guild_payload
+
+BOT_ID = 1
+VOICE_ENDPOINT = "sim.discord.media:443"
+
+
+class SimGateway:
+    """Answers the bot's voice state changes like Discord's gateway does"""
+
+    def __init__(self, bot, latency: float = 0.0):
+        self.bot = bot
+        self.latency = latency
+        self.voice_updates = 0
+        self._sessions = itertools.count(1)
+
+    async def voice_state(self, guild_id: int, channel_id: Optional[int], self_mute: bool = False, self_deaf: bool = False):
+        self.voice_updates += 1
+        asyncio.get_running_loop().call_later(self.latency, self._answer, guild_id, channel_id, self_mute, self_deaf)
+
+    def _answer(self, guild_id: int, channel_id: Optional[int], self_mute: bool, self_deaf: bool):
+        state = self.bot._connection
+        state.parse_voice_state_update(voice_state(guild_id, BOT_ID, channel_id, session_id=f"sim{next(self._sessions)}", self_mute=self_mute, self_deaf=self_deaf))
+        if channel_id is not None:
+            state.parse_voice_server_update({"token": "sim", "guild_id": str(guild_id), "endpoint": VOICE_ENDPOINT})
+
+    def is_ratelimited(self) -> bool:
+        return False
+
+
+class SimREST:
+    """Replaces ``HTTPClient.request``; every call costs ``latency`` and is counted per route"""
+
+    def __init__(self, bot, latency: float = 0.0):
+        self.bot = bot
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(10**17)
+
+    async def request(self, route, **kwargs):
+        key = f"{route.method} {route.path}"
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if route.path.startswith("/channels/{channel_id}/messages"):
+            return self._message(route, kwargs.get("json") or {})
+        if route.path == "/guilds/{guild_id}/members/{user_id}":
+            return {**_member(int(route.url.rsplit("/", 1)[-1])), **(kwargs.get("json") or {})}
+        return None
+
+    def _message(self, route, body: dict) -> dict:
+        # edits carry the message id in the url, sends get a new one
+        msg_id = route.url.rsplit("/", 1)[-1] if route.method == "PATCH" else next(self._ids)
+        return {
+            "id": str(msg_id),
+            "channel_id": str(route.channel_id),
+            "author": {**_user(BOT_ID), "bot": True},
+            "content": body.get("content") or "",
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": body.get("embeds") or [],
+            "pinned": False,
+            "type": 0,
+        }
+
+
+def voice_state(guild_id: int, user_id: int, channel_id: Optional[int], session_id: str = "sim", self_mute: bool = False, self_deaf: bool = False) -> dict:
+    """VOICE_STATE_UPDATE payload"""
+    return {
+        "guild_id": str(guild_id),
+        "channel_id": str(channel_id) if channel_id is not None else None,
+        "user_id": str(user_id),
+        "member": _member(user_id),
+        "session_id": session_id,
+        "deaf": False,
+        "mute": False,
+        "self_deaf": self_deaf,
+        "self_mute": self_mute,
+        "self_video": False,
+        "suppress": False,
+        "request_to_speak_timestamp": None,
+    }
+
+
+def message_payload(msg_id: int, guild_id: int, channel_id: int, user_id: int, content: str) -> dict:
+    """MESSAGE_CREATE payload from a guild member"""
+    member = _member(user_id)
+    member.pop("user")
+    return {
+        "id": str(msg_id),
+        "channel_id": str(channel_id),
+        "guild_id": str(guild_id),
+        "author": _user(user_id),
+        "member": member,
+        "content": content,
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+def voice_channel_id(guild_id: int) -> int:
+    return guild_id * 10_000 + 9_001
+
+
+def text_channel_id(guild_id: int) -> int:
+    return guild_id * 10_000 + 9_000
+
+
+def listeners_in_voice(guild_id: int, voice: int) -> list:
+    """User ids ``guild_payload`` puts in the voice channel"""
+    return [guild_id * 10_000 + i for i in range(1, voice + 1)]
+
+
+def make_bot(profile: str = "music", *, gateway_latency: float = 0.0, rest_latency: float = 0.0, workdir: Optional[str] = None):
+    """A DopplerDeckBot that never logs in; returns (bot, gateway, rest)"""
+    import music.commands as music_module
+    from gateway import gateway_options
+    from main import DopplerDeckBot
+    from music.snapshots import SessionStore
+
+    # no MySQL, and session snapshots go to a scratch file instead of sessions.db
+    workdir = workdir or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sim")
+    os.makedirs(workdir, exist_ok=True)
+    music_module.SessionStore = lambda path: SessionStore(os.path.join(workdir, f"sessions-{os.getpid()}.db"))
+
+    bot = DopplerDeckBot(
+        command_prefix=">",
+        **gateway_options(profile),
+        allowed_mentions=disnake.AllowedMentions.none(),
+        command_sync_flags=commands.CommandSyncFlags.none(),
+        help_command=None,
+    )
+    state = bot._connection
+    state.user = disnake.ClientUser(state=state, data={**_user(BOT_ID), "bot": True, "verified": True, "mfa_enabled": False, "flags": 0})
+    gateway = SimGateway(bot, gateway_latency)
+    rest = SimREST(bot, rest_latency)
+    state._get_websocket = lambda guild_id=None, *, shard_id=None: gateway
+    bot.http.request = rest.request
+    bot.restriction_db = FakeRestrictionDB()
+    bot._ready.set()
+    return bot, gateway, rest
+
+
+def add_guild(bot, guild_id: int, members: int = 50, voice: int = 3) -> disnake.Guild:
+    """Load one guild the way GUILD_CREATE would, with ``voice`` members in its voice channel"""
+    state = bot._connection
+    payload, _ = guild_payload(guild_id, members, voice, state._intents)
+    payload["members"].append({**_member(BOT_ID), "user": {**_user(BOT_ID), "bot": True}})
+    return state._add_guild_from_data(payload)
+
+
+async def start_lavalink(bot, *, threaded: bool = False, **options):
+    """Start a FakeLavalink and connect a mafic node to it; returns (server, node)
+
+    ``threaded`` serves it from another thread, stop it with ``server.stop_thread()``.
+    """
+    import mafic
+
+    from bench.fakelavalink import FakeLavalink
+
+    server = FakeLavalink(**options)
+    if threaded:
+        await asyncio.to_thread(server.start_in_thread)
+    else:
+        await server.start()
+    pool = mafic.NodePool(bot)
+    node = await pool.create_node(host=server.host, port=server.port, label="sim", password=server.password, player_cls=mafic.Player)
+    return server, node
+
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+import aiohttp
+
+import main as bot_main
+from config import get_config
+from ipc import ClusterIPCServer
+from logpipe import setup_logging
+
+log = logging.getLogger("DopplerDeck.cluster")
+
+# Discord allows one IDENTIFY per 5 seconds per bucket, stagger clusters to match
+IDENTIFY_INTERVAL = 5
+RESTART_CHECK_INTERVAL = 5
+
+
+def shard_ranges(shard_count: int, clusters: int) -> list[list[int]]:
+    """Split shard ids 0..shard_count-1 into contiguous ranges, one per cluster"""
+    clusters = max(1, min(clusters, shard_count))
+    per, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        size = per + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+async def recommended_shard_count(token: str) -> int:
+    headers = {"Authorization": f"Bot {token}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot", headers=headers) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+    return int(data["shards"])
+
+
+def _run_worker(cluster_id: int, shard_ids: list[int], shard_count: int, ipc_path: str):
+    bot_main.main(cluster_id=cluster_id, shard_ids=shard_ids, shard_count=shard_count, ipc_path=ipc_path)
+
+
+async def _supervise(ranges: list[list[int]], shard_count: int, ipc_path: str):
+    server = ClusterIPCServer(ipc_path)
+    await server.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    procs: dict[int, multiprocessing.Process] = {}
+
+    def spawn(cluster_id: int):
+        proc = ctx.Process(
+            target=_run_worker,
+            args=(cluster_id, ranges[cluster_id], shard_count, ipc_path),
+            name=f"dopplerdeck-cluster-{cluster_id}",
+        )
+        proc.start()
+        procs[cluster_id] = proc
+        log.info("Started cluster %d (pid %s) with shards %s", cluster_id, proc.pid, ranges[cluster_id])
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async def wait_or_stop(delay: float) -> bool:
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    try:
+        for cluster_id in range(len(ranges)):
+            spawn(cluster_id)
+            if await wait_or_stop(len(ranges[cluster_id]) * IDENTIFY_INTERVAL):
+                break
+        while not stop.is_set():
+            for cluster_id, proc in list(procs.items()):
+                if not proc.is_alive():
+                    log.warning("Cluster %d exited with code %s, restarting", cluster_id, proc.exitcode)
+                    spawn(cluster_id)
+            await wait_or_stop(RESTART_CHECK_INTERVAL)
+    finally:
+        log.info("Stopping %d cluster(s)", len(procs))
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in procs.values():
+            await asyncio.to_thread(proc.join, 30)
+        await server.close()
+
+
+def main():
+    cfg = get_config()
+    setup_logging(cfg)
+    clusters, ipc_path = cfg.clusters, cfg.ipc_path
+    shard_count = cfg.shard_count
+    if shard_count is None:
+        shard_count = asyncio.run(recommended_shard_count(bot_main.get_token()))
+        log.info("Discord recommends %d shard(s)", shard_count)
+    ranges = shard_ranges(shard_count, clusters)
+    log.info("Launching %d cluster(s) for %d shard(s)", len(ranges), shard_count)
+    asyncio.run(_supervise(ranges, shard_count, ipc_path))
+
+
+if __name__ == "__main__":
+    main()
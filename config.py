@@ -0,0 +1,234 @@
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import tomllib as toml
+except ModuleNotFoundError:
+    import tomli as toml
+
+CONFIG_PATH = "config.toml"
+DEFAULT_EMBED_COLOR = 0x8BC6E8
+# command -> scope -> (per minute, burst) for [ratelimit]
+RATE_LIMIT_DEFAULTS = {
+    "play": {"user": (10, 5), "guild": (30, 15)},
+    "radio": {"user": (6, 3), "guild": (12, 6)},
+    "votes": {"user": (4, 2), "guild": (0, 0)},
+}
+
+log = logging.getLogger("DopplerDeck.config")
+
+
+class ConfigService:
+    """config.toml parsed once and re-parsed only when the file's mtime changes.
+
+    Callers read through the typed accessors; ``reload_if_changed`` is cheap
+    (a single stat) and notifies subscribers when the file was actually re-read.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self._data: dict = {}
+        self._mtime: Optional[int] = None
+        self._listeners: List[Callable[["ConfigService"], None]] = []
+
+    @property
+    def data(self) -> dict:
+        if self._mtime is None:
+            self.reload_if_changed()
+        return self._data
+
+    def reload_if_changed(self) -> bool:
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return False
+        with open(self.path, "rb") as f:
+            data = toml.load(f)
+        first = self._mtime is None
+        self._data, self._mtime = data, mtime
+        if not first:
+            log.info("Reloaded %s", self.path)
+            for listener in list(self._listeners):
+                try:
+                    listener(self)
+                except Exception:
+                    log.exception("Config listener %r failed", listener)
+        return True
+
+    def subscribe(self, listener: Callable[["ConfigService"], None]):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[["ConfigService"], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def section(self, name: str) -> dict:
+        value = self.data.get(name, {})
+        return value if isinstance(value, dict) else {}
+
+    @property
+    def embed_color(self) -> int:
+        return int(self.data.get("embed color", DEFAULT_EMBED_COLOR))
+
+    @property
+    def modules(self) -> List[str]:
+        return [str(x) for x in self.section("cogs").get("modules", [])]
+
+    @property
+    def shard_count(self) -> Optional[int]:
+        # 0 / missing lets Discord recommend a shard count
+        count = int(self.section("sharding").get("shard_count", 0))
+        return count if count > 0 else None
+
+    @property
+    def gateway_profile(self) -> str:
+        # configs without a [gateway] section keep the old all-intents behaviour
+        return str(self.section("gateway").get("profile", "full"))
+
+    @property
+    def member_cache(self) -> Optional[List[str]]:
+        value = self.section("gateway").get("member_cache")
+        return None if value is None else [str(x) for x in value]
+
+    @property
+    def chunk_guilds_at_startup(self) -> Optional[bool]:
+        value = self.section("gateway").get("chunk_guilds_at_startup")
+        return None if value is None else bool(value)
+
+    @property
+    def idle_timeout(self) -> int:
+        return int(self.section("music").get("idle_timeout", 300))
+
+    @property
+    def paused_timeout(self) -> int:
+        return int(self.section("music").get("paused_timeout", 900))
+
+    @property
+    def now_playing_progress(self) -> bool:
+        return bool(self.section("music").get("now_playing_progress", False))
+
+    @property
+    def now_playing_refresh(self) -> int:
+        # seconds between progress bar edits, never faster than the channel edit limit allows
+        return max(5, int(self.section("music").get("now_playing_refresh", 15)))
+
+    @property
+    def snapshot_path(self) -> str:
+        return str(self.section("music").get("snapshot_path", "sessions.db"))
+
+    @property
+    def snapshot_interval(self) -> int:
+        return max(5, int(self.section("music").get("snapshot_interval", 15)))
+
+    @property
+    def shutdown_deadline(self) -> int:
+        return max(1, int(self.section("shutdown").get("deadline", 25)))
+
+    @property
+    def shutdown_notify(self) -> bool:
+        return bool(self.section("shutdown").get("notify", False))
+
+    @property
+    def shutdown_keep_players(self) -> bool:
+        return bool(self.section("shutdown").get("keep_players", True))
+
+    @property
+    def metrics_enabled(self) -> bool:
+        return bool(self.section("metrics").get("enabled", False))
+
+    @property
+    def metrics_host(self) -> str:
+        return str(self.section("metrics").get("host", "127.0.0.1"))
+
+    @property
+    def metrics_port(self) -> int:
+        return int(self.section("metrics").get("port", 9100))
+
+    @property
+    def metrics_path(self) -> str:
+        return str(self.section("metrics").get("path", "/metrics"))
+
+    @property
+    def trace_sample_rate(self) -> float:
+        return min(1.0, max(0.0, float(self.section("tracing").get("sample_rate", 0.0))))
+
+    @property
+    def trace_keep(self) -> int:
+        return max(1, int(self.section("tracing").get("keep", 100)))
+
+    @property
+    def trace_export_path(self) -> Optional[str]:
+        return str(self.section("tracing").get("export_path", "")) or None
+
+    @property
+    def loop_sample_interval(self) -> float:
+        return max(0.05, float(self.section("monitor").get("loop_interval", 0.5)))
+
+    @property
+    def slow_callback_ms(self) -> int:
+        return int(self.section("monitor").get("slow_callback_ms", 100))
+
+    @property
+    def log_level(self) -> str:
+        return str(self.section("logging").get("level", "INFO")).upper()
+
+    @property
+    def log_levels(self) -> Dict[str, str]:
+        levels = self.section("logging").get("levels", {})
+        return {str(k): str(v).upper() for k, v in levels.items()} if isinstance(levels, dict) else {}
+
+    @property
+    def log_format(self) -> str:
+        return "json" if str(self.section("logging").get("format", "text")).lower() == "json" else "text"
+
+    @property
+    def log_file(self) -> Optional[str]:
+        return str(self.section("logging").get("file", "")) or None
+
+    @property
+    def log_queue_size(self) -> int:
+        return max(100, int(self.section("logging").get("queue_size", 10_000)))
+
+    @property
+    def log_duplicate_window(self) -> float:
+        return max(0.0, float(self.section("logging").get("duplicate_window", 60)))
+
+    @property
+    def log_duplicate_burst(self) -> int:
+        return max(1, int(self.section("logging").get("duplicate_burst", 5)))
+
+    @property
+    def rate_limits(self) -> Dict[str, Dict[str, Tuple[float, int]]]:
+        """command -> scope -> (per minute, burst); 0 per minute leaves that scope unlimited"""
+        section = self.section("ratelimit")
+        if not section.get("enabled", True):
+            return {}
+        limits = {}
+        for command, defaults in RATE_LIMIT_DEFAULTS.items():
+            table = section.get(command, {})
+            table = table if isinstance(table, dict) else {}
+            limits[command] = {
+                scope: (float(table.get(f"{scope}_per_minute", rate)), int(table.get(f"{scope}_burst", burst)))
+                for scope, (rate, burst) in defaults.items()
+            }
+        return limits
+
+    @property
+    def clusters(self) -> int:
+        return max(1, int(self.section("cluster").get("clusters", 1)))
+
+    @property
+    def ipc_path(self) -> str:
+        return str(self.section("cluster").get("ipc_path", "dopplerdeck-ipc.sock"))
+
+
+_config: Optional[ConfigService] = None
+
+
+def get_config() -> ConfigService:
+    """The process-wide ConfigService"""
+    global _config
+    if _config is None:
+        _config = ConfigService()
+    return _config
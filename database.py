@@ -1,6 +1,16 @@
 import mysql.connector
 import os
+import functools
 from typing import Optional
+from metrics import MYSQL_QUERY_SECONDS
+from tracing import span
+
+def _timed(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with MYSQL_QUERY_SECONDS.time(query=func.__name__), span(f"mysql {func.__name__}"):
+            return func(*args, **kwargs)
+    return wrapper
 
 class RestrictionDB:
     def __init__(self):
@@ -20,6 +30,7 @@ class RestrictionDB:
             database=self.database
         )
     
+    @_timed
     def _init_db(self):
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -33,6 +44,7 @@ class RestrictionDB:
         cursor.close()
         conn.close()
     
+    @_timed
     def set_restriction(self, guild_id: int, channel_id: int):
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -45,6 +57,7 @@ class RestrictionDB:
         cursor.close()
         conn.close()
     
+    @_timed
     def get_restriction(self, guild_id: int) -> Optional[int]:
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -56,6 +69,7 @@ class RestrictionDB:
         conn.close()
         return result[0] if result else None
     
+    @_timed
     def remove_restriction(self, guild_id: int):
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -68,3 +82,11 @@ class RestrictionDB:
     
     def has_restriction(self, guild_id: int) -> bool:
         return self.get_restriction(guild_id) is not None
+
+def get_restriction_db(bot) -> RestrictionDB:
+    """The RestrictionDB shared by every cog, built off the event loop in setup_hook;
+    created here only if that failed or hasn't run"""
+    db = getattr(bot, "restriction_db", None)
+    if db is None:
+        db = bot.restriction_db = RestrictionDB()
+    return db
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+import disnake
+from disnake.ext import commands
+
+from config import get_config
+from metrics import rss_bytes
+from recorder import EventRecorder
+from tracing import get_tracer
+
+MAX_TRACES_SHOWN = 10
+MAX_SPANS_SHOWN = 8
+MAX_STALLS_SHOWN = 3
+STACK_LINES_SHOWN = 4
+TOP_ALLOCATORS = 8
+TOP_GUILDS = 5
+RECORD_DIR = "recordings"
+# tracemalloc slows every allocation, so it only runs this long after the last >debug mem
+MEM_TRACE_SECONDS = 600
+MAX_RECORD_SECONDS = 3600
+
+# per-guild state kept by the Music cog; anything left here without a player is a leak
+MUSIC_GUILD_STATE = (
+    "_players", "_vc_map", "_humans", "_queues", "_current", "_current_req", "_last",
+    "_last_text_channel", "_stopped", "_intro_played", "_np_messages", "_np_timers",
+)
+
+
+def _mb(n: float) -> str:
+    return f"{n / 2**20:.1f} MB"
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+
+def _track_size(track) -> int:
+    # tracks are __slots__ objects, the encoded id string dominates
+    size = sys.getsizeof(track)
+    for name in getattr(type(track), "__slots__", ()):
+        value = getattr(track, name, None)
+        if isinstance(value, (str, bytes, int, float)):
+            size += sys.getsizeof(value)
+    return size
+
+
+def _music_report(music) -> dict:
+    queues = getattr(music, "_queues", {})
+    players = getattr(music, "_players", {})
+    per_guild = []
+    for gid, q in queues.items():
+        size = sys.getsizeof(q) + sum(sys.getsizeof(item) + _track_size(item.track) for item in q)
+        per_guild.append((gid, len(q), size))
+    per_guild.sort(key=lambda x: x[1], reverse=True)
+    search_cache = getattr(music, "_search_cache", {})
+    cache_size = 0
+    for _, results in search_cache.values():
+        tracks = getattr(results, "tracks", results) or []
+        cache_size += sum(_track_size(t) for t in tracks)
+    leftovers = {}
+    for name in MUSIC_GUILD_STATE[1:]:
+        stale = [gid for gid in getattr(music, name, {}) if gid not in players]
+        if stale:
+            leftovers[name] = len(stale)
+    return {
+        "players": len(players),
+        "queued": sum(n for _, n, _ in per_guild),
+        "queue_bytes": sum(b for _, _, b in per_guild),
+        "top": per_guild[:TOP_GUILDS],
+        "search_cache": (len(search_cache), cache_size),
+        "dicts": {name: len(getattr(music, name, {})) for name in MUSIC_GUILD_STATE},
+        "leftovers": leftovers,
+    }
+
+
+def _trace_lines(tr) -> str:
+    root = tr.root
+    head = f"**{root.name}** — `{tr.duration_ms:.0f} ms`"
+    if root.attributes.get("guild_id"):
+        head += f" · guild `{root.attributes['guild_id']}`"
+    if root.error:
+        head += " · ❌"
+    # the phases that took longest, in the order they ran
+    spans = sorted(tr.spans[1:], key=lambda s: s.duration_ms, reverse=True)[:MAX_SPANS_SHOWN]
+    spans.sort(key=lambda s: s.start_ns)
+    lines = [head]
+    for sp in spans:
+        offset = (sp.start_ns - root.start_ns) / 1e6
+        extra = f" ({sp.attributes['cache']})" if "cache" in sp.attributes else ""
+        lines.append(f"└ `+{offset:.0f}` {sp.name}{extra} `{sp.duration_ms:.0f} ms`")
+    return "\n".join(lines)
+
+
+class Debug(commands.Cog):
+    """Owner-only diagnostics"""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.color = get_config().embed_color
+        self._mem_snapshot = None
+        self._mem_music = None
+        self._trace_timer = None
+        self._recorder = None
+        self._record_timer = None
+
+    def cog_unload(self):
+        self._stop_tracing()
+        if self._recorder is not None and self._recorder.recording:
+            asyncio.ensure_future(self._stop_recording())
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        return await self.bot.is_owner(ctx.author)
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, cfg):
+        self.color = cfg.embed_color
+
+    @commands.group(name="debug", invoke_without_command=True)
+    async def debug_group(self, ctx: commands.Context):
+        await ctx.send(
+            embed=disnake.Embed(
+                title="Debug",
+                description="`>debug traces [count]`\n`>debug loop`\n`>debug mem`\n`>debug record <seconds|stop>`",
+                color=self.color,
+            )
+        )
+
+    @debug_group.command(name="traces")
+    async def traces(self, ctx: commands.Context, count: int = 5):
+        tracer = get_tracer()
+        slowest = tracer.slowest(max(1, min(count, MAX_TRACES_SHOWN)))
+        if not slowest:
+            desc = "No traces recorded yet." if tracer.sample_rate > 0 else "Tracing is off, set `[tracing] sample_rate` in config.toml."
+            await ctx.send(embed=disnake.Embed(title="Slowest Traces", description=desc, color=self.color))
+            return
+        emb = disnake.Embed(
+            title="Slowest Traces",
+            description="\n\n".join(_trace_lines(tr) for tr in slowest)[:4000],
+            color=self.color,
+        )
+        emb.set_footer(text=f"{len(tracer.recent)} recent trace(s) · sample rate {tracer.sample_rate:g}")
+        await ctx.send(embed=emb)
+
+    @debug_group.command(name="loop")
+    async def loop(self, ctx: commands.Context):
+        monitor = getattr(self.bot, "loop_monitor", None)
+        if monitor is None:
+            await ctx.send(embed=disnake.Embed(title="Event Loop", description="The loop monitor is off, set `[monitor] slow_callback_ms` in config.toml.", color=self.color))
+            return
+        stats = monitor.summary()
+        emb = disnake.Embed(
+            title="Event Loop",
+            description=(
+                f"Lag p50 `{stats['p50'] * 1000:.1f} ms` · p99 `{stats['p99'] * 1000:.1f} ms` · max `{stats['max'] * 1000:.1f} ms`\n"
+                f"{stats['samples']} samples every {monitor.interval:g}s · {len(monitor.stalls)} stall(s) over {monitor.threshold * 1000:.0f} ms"
+            ),
+            color=self.color,
+        )
+        for stall in list(monitor.stalls)[-MAX_STALLS_SHOWN:][::-1]:
+            # the innermost frames are the ones that were blocking
+            frames = "".join(stall.stack[-STACK_LINES_SHOWN:]).strip() or "stack not captured"
+            emb.add_field(
+                name=f"{stall.duration * 1000:.0f} ms{f' in {stall.task}' if stall.task else ''} — <t:{int(stall.at)}:R>",
+                value=f"```py\n{frames[-1000:]}\n```",
+                inline=False,
+            )
+        await ctx.send(embed=emb)
+
+    def _stop_tracing(self):
+        if self._trace_timer is not None:
+            self._trace_timer.cancel()
+            self._trace_timer = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        # growth against a snapshot from an earlier tracing window means nothing
+        self._mem_snapshot = None
+
+    def _extend_tracing(self, emb: disnake.Embed):
+        if self._trace_timer is not None:
+            self._trace_timer.cancel()
+        self._trace_timer = self.bot.timers.call_later(MEM_TRACE_SECONDS, self._stop_tracing)
+        emb.set_footer(text=f"tracemalloc is on until {MEM_TRACE_SECONDS // 60} min after the last >debug mem, or >debug mem stop")
+
+    @debug_group.command(name="mem")
+    async def mem(self, ctx: commands.Context, action: str = None):
+        if action is not None:
+            if action.lower() != "stop":
+                raise commands.BadArgument("the only option is `stop`")
+            tracing = tracemalloc.is_tracing()
+            self._stop_tracing()
+            desc = "Stopped tracing allocations." if tracing else "tracemalloc was not running."
+            await ctx.send(embed=disnake.Embed(title="Memory", description=desc, color=self.color))
+            return
+
+        emb = disnake.Embed(title="Memory", description=f"RSS `{_mb(rss_bytes())}`", color=self.color)
+
+        music = self.bot.get_cog("Music")
+        if music is not None:
+            report = _music_report(music)
+            emb.add_field(
+                name="Music",
+                value=(
+                    f"{report['players']} player(s), {report['queued']} queued track(s) ≈ `{_mb(report['queue_bytes'])}`\n"
+                    f"Search cache: {report['search_cache'][0]} entries ≈ `{_mb(report['search_cache'][1])}`\n"
+                    + " · ".join(f"{name.strip('_')} {n}" for name, n in report["dicts"].items())
+                ),
+                inline=False,
+            )
+            if report["top"]:
+                emb.add_field(
+                    name=f"Top {len(report['top'])} guilds by queue",
+                    value="\n".join(f"`{gid}` — {n} tracks ≈ `{size / 1024:.0f} KB`" for gid, n, size in report["top"]),
+                    inline=False,
+                )
+            if report["leftovers"]:
+                emb.add_field(
+                    name="State without a player",
+                    value="\n".join(f"{name.strip('_')}: {n} guild(s)" for name, n in report["leftovers"].items()),
+                    inline=False,
+                )
+            prev, self._mem_music = self._mem_music, report
+            if prev is not None:
+                growth = {k: report["dicts"][k] - prev["dicts"].get(k, 0) for k in report["dicts"]}
+                changed = [f"{k.strip('_')} {d:+d}" for k, d in growth.items() if d]
+                emb.add_field(name="Music since last call", value=" · ".join(changed) or "no change", inline=False)
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            emb.add_field(name="tracemalloc", value="Started tracing allocations now, run `>debug mem` again to see allocators and growth.", inline=False)
+            self._extend_tracing(emb)
+            await ctx.send(embed=emb)
+            return
+        self._extend_tracing(emb)
+
+        # walking every trace is slow with a big heap, keep it off the event loop
+        snapshot = await asyncio.to_thread(_take_snapshot)
+        top = await asyncio.to_thread(snapshot.statistics, "lineno")
+        current, peak = tracemalloc.get_traced_memory()
+        emb.add_field(
+            name=f"Top allocators (traced {_mb(current)}, peak {_mb(peak)})",
+            value="```\n" + "\n".join(f"{_mb(st.size):>9} {st.traceback[0].filename.rsplit('/', 1)[-1]}:{st.traceback[0].lineno}" for st in top[:TOP_ALLOCATORS])[:1000] + "\n```",
+            inline=False,
+        )
+        prev, self._mem_snapshot = self._mem_snapshot, snapshot
+        if prev is not None:
+            diff = await asyncio.to_thread(snapshot.compare_to, prev, "lineno")
+            grown = [d for d in diff if d.size_diff > 0][:TOP_ALLOCATORS]
+            if grown:
+                emb.add_field(
+                    name="Growth since last call",
+                    value="```\n" + "\n".join(f"{d.size_diff / 1024:>+9.0f} KB {d.traceback[0].filename.rsplit('/', 1)[-1]}:{d.traceback[0].lineno}" for d in grown)[:1000] + "\n```",
+                    inline=False,
+                )
+        await ctx.send(embed=emb)
+
+    @debug_group.command(name="record")
+    async def record(self, ctx: commands.Context, seconds: str = "60"):
+        rec = self._recorder
+        if seconds.lower() == "stop":
+            if rec is None or not rec.recording:
+                await ctx.send(embed=disnake.Embed(title="Recording", description="Nothing is being recorded.", color=self.color))
+                return
+            await self._stop_recording()
+            await ctx.send(embed=self._record_embed(rec))
+            return
+        if rec is not None and rec.recording:
+            await ctx.send(embed=disnake.Embed(title="Recording", description=f"Already recording to `{rec.path}`, `>debug record stop` ends it.", color=self.color))
+            return
+        try:
+            duration = max(1, min(int(seconds), MAX_RECORD_SECONDS))
+        except ValueError:
+            raise commands.BadArgument("seconds must be a number or `stop`")
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        path = os.path.join(RECORD_DIR, f"events-{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+        self._recorder = EventRecorder(self.bot, path, prefix=ctx.prefix or ">")
+        self._recorder.start()
+        self._record_timer = self.bot.timers.call_later(duration, self._finish_recording, ctx.channel)
+        await ctx.send(embed=disnake.Embed(
+            title="Recording",
+            description=f"Recording sanitized gateway and Lavalink events to `{path}` for {duration}s.\nReplay it with `python -m bench.replay {path}`.",
+            color=self.color,
+        ))
+
+    async def _stop_recording(self):
+        if self._record_timer is not None:
+            self._record_timer.cancel()
+            self._record_timer = None
+        await self._recorder.stop()
+
+    async def _finish_recording(self, channel):
+        self._record_timer = None
+        await self._recorder.stop()
+        await channel.send(embed=self._record_embed(self._recorder))
+
+    def _record_embed(self, rec: EventRecorder) -> disnake.Embed:
+        size = os.path.getsize(rec.path) if os.path.exists(rec.path) else 0
+        return disnake.Embed(
+            title="Recording finished",
+            description=f"{rec.events} event(s) written to `{rec.path}` ({size / 1024:.0f} KB).",
+            color=self.color,
+        )
+
+
+def setup(bot):
+    bot.add_cog(Debug(bot))
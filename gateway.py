@@ -0,0 +1,49 @@
+import disnake
+
+# minimal: slash commands only (guild + voice state events)
+# music:   minimal plus guild messages / message content for the ">" prefix commands
+# full:    every intent and a full member cache, the old behaviour
+PROFILES = ("minimal", "music", "full")
+
+
+def profile_intents(profile: str) -> disnake.Intents:
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown gateway profile {profile!r}, expected one of {', '.join(PROFILES)}")
+    if profile == "full":
+        return disnake.Intents.all()
+    intents = disnake.Intents.none()
+    intents.guilds = True
+    intents.voice_states = True
+    if profile == "music":
+        intents.guild_messages = True
+        intents.message_content = True
+    return intents
+
+
+def member_cache_flags(profile: str, intents: disnake.Intents, override: list[str] | None = None) -> disnake.MemberCacheFlags:
+    """Member cache for a profile, or exactly the flags named in ``override``"""
+    if override is not None:
+        flags = disnake.MemberCacheFlags.none()
+        for name in override:
+            setattr(flags, name, True)
+        return flags
+    if profile == "full":
+        return disnake.MemberCacheFlags.from_intents(intents)
+    # VoiceChannel.members and the auto-leave check only need members that are in voice
+    flags = disnake.MemberCacheFlags.none()
+    flags.voice = True
+    return flags
+
+
+def gateway_options(profile: str, member_cache: list[str] | None = None, chunk_guilds_at_startup: bool | None = None) -> dict:
+    """Keyword arguments for the bot constructor: intents, member cache and chunking"""
+    intents = profile_intents(profile)
+    flags = member_cache_flags(profile, intents, member_cache)
+    if chunk_guilds_at_startup is None:
+        # chunking only makes sense when the member list is cached
+        chunk_guilds_at_startup = intents.members and flags.joined
+    return {
+        "intents": intents,
+        "member_cache_flags": flags,
+        "chunk_guilds_at_startup": chunk_guilds_at_startup,
+    }
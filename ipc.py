@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+log = logging.getLogger("DopplerDeck.ipc")
+
+# a cluster that hasn't reported for this long is left out of the aggregate
+STALE_AFTER = 90
+
+
+def empty_stats() -> dict:
+    return {"guilds": 0, "members": 0, "voice": 0, "shards": {}}
+
+
+def merge_stats(parts) -> dict:
+    """Sum per-cluster stats dicts into one aggregate"""
+    total = empty_stats()
+    for part in parts:
+        total["guilds"] += int(part.get("guilds", 0))
+        total["members"] += int(part.get("members", 0))
+        total["voice"] += int(part.get("voice", 0))
+        for sid, shard in part.get("shards", {}).items():
+            total["shards"][int(sid)] = shard
+    return total
+
+
+class ClusterIPCServer:
+    """Unix socket hub run by the cluster launcher.
+
+    Workers push their local stats with ``{"op": "stats"}`` and ask for the
+    fleet-wide sum with ``{"op": "aggregate"}``. Messages are newline-delimited
+    JSON; every request carries an ``id`` that is echoed in the reply.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stats: Dict[int, tuple[float, dict]] = {}
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+        log.info("Cluster IPC listening on %s", self.path)
+
+    async def close(self):
+        for writer in list(self._writers):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def aggregate(self) -> dict:
+        now = time.monotonic()
+        live = [stats for seen, stats in self._stats.values() if now - seen < STALE_AFTER]
+        total = merge_stats(live)
+        total["clusters"] = len(live)
+        return total
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        cluster_id = None
+        self._writers.add(writer)
+        try:
+            while line := await reader.readline():
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                op = msg.get("op")
+                reply: Dict[str, Any] = {"id": msg.get("id"), "ok": True}
+                if op == "stats":
+                    cluster_id = int(msg["cluster"])
+                    self._stats[cluster_id] = (time.monotonic(), msg.get("data", {}))
+                elif op == "aggregate":
+                    reply["data"] = self.aggregate()
+                else:
+                    reply = {"id": msg.get("id"), "ok": False, "error": f"unknown op {op!r}"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if cluster_id is not None:
+                self._stats.pop(cluster_id, None)
+                log.info("Cluster %d disconnected from IPC", cluster_id)
+            self._writers.discard(writer)
+            writer.close()
+
+
+class ClusterIPCClient:
+    """Worker side of the cluster IPC channel"""
+
+    def __init__(self, path: str, cluster_id: int, timeout: float = 5.0):
+        self.path = path
+        self.cluster_id = cluster_id
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _ensure_connected(self):
+        async with self._lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+            self._read_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        try:
+            while line := await self._reader.readline():
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                fut = self._pending.pop(msg.get("id"), None)
+                if fut and not fut.done():
+                    fut.set_result(msg)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("cluster IPC connection closed"))
+            self._pending.clear()
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+
+    async def request(self, op: str, **fields) -> dict:
+        await self._ensure_connected()
+        msg_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = fut
+        self._writer.write(json.dumps({"op": op, "id": msg_id, **fields}).encode() + b"\n")
+        await self._writer.drain()
+        try:
+            reply = await asyncio.wait_for(fut, timeout=self.timeout)
+        finally:
+            self._pending.pop(msg_id, None)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "IPC request failed"))
+        return reply
+
+    async def publish(self, stats: dict):
+        await self.request("stats", cluster=self.cluster_id, data=stats)
+
+    async def aggregate(self) -> dict:
+        reply = await self.request("aggregate")
+        data = reply.get("data", {})
+        data["shards"] = {int(sid): shard for sid, shard in data.get("shards", {}).items()}
+        return data
+
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -0,0 +1,215 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import get_config
+from metrics import LOG_RECORDS_DROPPED
+
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+# attributes every LogRecord has; anything else on a record came in through ``extra=``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+_MAX_KEYS = 2_000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, extras and traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar suppressed)" if suppressed else text
+
+
+class DuplicateFilter(logging.Filter):
+    """Lets ``burst`` records with the same logger, level and message template
+    through per ``window`` seconds and drops the rest.
+
+    The template is the unformatted message, so an error logged in a loop with
+    a different guild or exception text each time still counts as a repeat.
+    The next record that gets through carries how many were dropped.
+    """
+
+    def __init__(self, window: float = 60.0, burst: int = 5):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._seen: Dict[Tuple, list] = {}  # key -> [window start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.window <= 0:
+            return True
+        exc = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.levelno, str(record.msg), exc)
+        now = record.created
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is None or now - seen[0] >= self.window:
+                if len(self._seen) >= _MAX_KEYS:
+                    self._prune(now)
+                suppressed = seen[2] if seen is not None else 0
+                self._seen[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            seen[1] += 1
+            if seen[1] <= self.burst:
+                return True
+            seen[2] += 1
+        LOG_RECORDS_DROPPED.inc(reason="duplicate")
+        return False
+
+    def _prune(self, now: float):
+        self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: a full queue drops the record and counts it"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # only merge the args and render the traceback here, formatting happens on the writer thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+
+class LogPipeline:
+    """Root logger -> bounded queue -> writer thread -> stderr and/or a file.
+
+    Callers on the event loop only pay for filtering and a queue put; the
+    formatting and the (possibly blocking) writes happen on the listener
+    thread. ``stop`` drains what is queued.
+    """
+
+    def __init__(self, *, fmt: str = "text", path: Optional[str] = None, queue_size: int = 10_000,
+                 window: float = 60.0, burst: int = 5):
+        formatter = JsonFormatter() if fmt == "json" else TextFormatter()
+        handlers = []
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(formatter)
+        handlers.append(stream)
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            file = logging.FileHandler(path, encoding="utf-8")
+            file.setFormatter(formatter)
+            handlers.append(file)
+        self.pid = os.getpid()
+        self.queue: queue.Queue = queue.Queue(max(1, queue_size))
+        self.handler = _QueueHandler(self.queue)
+        self.duplicates = DuplicateFilter(window, burst)
+        self.handler.addFilter(self.duplicates)
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._handlers = handlers
+
+    def start(self):
+        logging.getLogger().addHandler(self.handler)
+        self.listener.start()
+
+    def stop(self):
+        logging.getLogger().removeHandler(self.handler)
+        # a forked child inherits the pipeline but not its thread, only the parent can drain it
+        if self.pid == os.getpid():
+            self.listener.stop()
+            for h in self._handlers:
+                h.close()
+
+
+_pipeline: Optional[LogPipeline] = None
+_overridden: set = set()
+
+
+def setup_logging(cfg=None) -> LogPipeline:
+    """Route every logger through a fresh pipeline configured from ``[logging]``;
+    replaces basicConfig-style handlers and any previous pipeline"""
+    global _pipeline
+    cfg = cfg or get_config()
+    error = None
+    try:
+        options = dict(fmt=cfg.log_format, path=cfg.log_file, queue_size=cfg.log_queue_size,
+                       window=cfg.log_duplicate_window, burst=cfg.log_duplicate_burst)
+    except Exception as exc:
+        options, error = {}, exc
+    if _pipeline is not None:
+        _pipeline.stop()
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    _pipeline = LogPipeline(**options)
+    _pipeline.start()
+    if error is not None:
+        logging.getLogger("DopplerDeck.logging").error("Invalid [logging] config, using defaults: %r", error)
+    apply_levels(cfg)
+    return _pipeline
+
+
+def apply_levels(cfg):
+    """Root level plus per-logger overrides from ``[logging.levels]``; safe to call on every config reload"""
+    log = logging.getLogger("DopplerDeck.logging")
+    try:
+        logging.getLogger().setLevel(cfg.log_level)
+        levels = cfg.log_levels
+    except Exception as exc:
+        log.error("Invalid [logging] levels: %r", exc)
+        return
+    # loggers dropped from the config go back to inheriting the root level
+    for name in _overridden - set(levels):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    _overridden.clear()
+    for name, level in levels.items():
+        try:
+            logging.getLogger(name).setLevel(level)
+            _overridden.add(name)
+        except (TypeError, ValueError) as exc:
+            log.error("Invalid level for logger %s: %r", name, exc)
+
+
+def stop_logging():
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline.stop()
+        _pipeline = None
+
+
+atexit.register(stop_logging)
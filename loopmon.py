@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional
+
+from metrics import LOOP_LAG, SLOW_CALLBACKS
+
+log = logging.getLogger("DopplerDeck.loop")
+
+STACK_DEPTH = 12
+LAG_WINDOW = 600  # samples kept for percentiles, 5 min at the default interval
+
+
+class Stall(NamedTuple):
+    at: float  # wall clock time the stall ended
+    duration: float
+    task: Optional[str]
+    stack: List[str]
+
+
+class LoopMonitor:
+    """Measures event loop lag and catches callbacks that block it.
+
+    A tick scheduled every ``interval`` seconds records how late it ran. A
+    watchdog thread notices when a tick is more than ``threshold`` overdue and
+    captures the loop thread's stack while it is still stuck, so the report
+    names the code that blocked rather than whatever ran afterwards.
+    """
+
+    def __init__(self, interval: float = 0.5, threshold: float = 0.1, keep: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self.stalls: Deque[Stall] = deque(maxlen=keep)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._expected = 0.0
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._captured: Optional[tuple] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._handle is not None
+
+    def start(self):
+        if self._handle is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._schedule(time.monotonic())
+        self._watchdog = threading.Thread(target=self._watch, name="dopplerdeck-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def summary(self) -> dict:
+        lags = sorted(self.lags)
+        if not lags:
+            return {"samples": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "samples": len(lags),
+            "p50": lags[len(lags) // 2],
+            "p99": lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+            "max": lags[-1],
+        }
+
+    def _schedule(self, now: float):
+        self._expected = now + self.interval
+        self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def _tick(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected)
+        self.lags.append(lag)
+        LOOP_LAG.observe(lag)
+        if lag >= self.threshold:
+            self._report(lag)
+        self._schedule(now)
+
+    def _report(self, lag: float):
+        captured, self._captured = self._captured, None
+        task, stack = (captured[1], captured[2]) if captured and captured[0] == self._expected else (None, [])
+        self.stalls.append(Stall(time.time(), lag, task, stack))
+        SLOW_CALLBACKS.inc()
+        if stack:
+            log.warning("Event loop blocked for %.0f ms%s, stack while blocked:\n%s", lag * 1000, f" in task {task}" if task else "", "".join(stack))
+        else:
+            log.warning("Event loop blocked for %.0f ms (stall was too short to capture a stack)", lag * 1000)
+
+    def _watch(self):
+        poll = max(0.01, self.threshold / 4)
+        while not self._stop.wait(poll):
+            expected = self._expected
+            if time.monotonic() - expected < self.threshold:
+                continue
+            if self._captured is not None and self._captured[0] == expected:
+                continue  # already have this stall's stack
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame)[-STACK_DEPTH:]
+            task = None
+            try:
+                current = asyncio.tasks._current_tasks.get(self._loop)  # read-only peek from another thread
+                task = current.get_name() if current is not None else None
+            except Exception:
+                pass
+            self._captured = (expected, task, stack)
@@ -1,16 +1,28 @@
 import os
+import json
+import signal
+import math
+import time
+import hashlib
+import contextlib
+import cProfile
+import pstats
+import asyncio
 import logging
 import disnake
-from disnake.ext import commands, tasks
+from disnake.ext import commands
 from lavalink import ensure_lavalink, NODE_CONFIG
 from database import RestrictionDB
+from ipc import ClusterIPCClient
+from config import get_config, DEFAULT_EMBED_COLOR
+from gateway import gateway_options
+from timers import TimerWheel
+from tracing import get_tracer
+from loopmon import LoopMonitor
+from logpipe import apply_levels, setup_logging
+from ratelimit import get_limits
+from metrics import COMMAND_SECONDS, GATEWAY_LATENCY, PRESENCE_UPDATES, MetricsServer, watch_rate_limits
 
-try:
-    import tomllib as toml
-except ModuleNotFoundError:
-    import tomli as toml
-
-logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
 log = logging.getLogger("DopplerDeck")
 
 try:
@@ -20,7 +32,11 @@ except Exception:
     pass
 
 OWNER_ID = 1362053982444454119
-CONFIG_PATH = "config.toml"
+COMMAND_HASH_PATH = ".command_hash"
+TRACE_EXPORT_INTERVAL = 5
+PROFILE_DIR = "profiles"
+PROFILE_MAX_SECONDS = 120
+PROFILE_TOP = 15
 
 def get_token() -> str:
     token = os.getenv("prod") or os.getenv("PROD")
@@ -28,18 +44,6 @@ def get_token() -> str:
         raise RuntimeError("Bot token not found. Set environment variable 'prod' (or 'PROD').")
     return token
 
-def load_config() -> dict:
-    with open(CONFIG_PATH, "rb") as f:
-        return toml.load(f)
-
-def embed_color_from(cfg: dict) -> int:
-    return int(cfg.get("embed color", 0x8BC6E8))
-
-def configured_modules(cfg: dict) -> list[str]:
-    c = cfg.get("cogs", {})
-    m = c.get("modules", [])
-    return [str(x) for x in m]
-
 def normalize_target(name: str, allowed: list[str]) -> str | None:
     if name in allowed:
         return name
@@ -58,46 +62,283 @@ def normalize_target(name: str, allowed: list[str]) -> str | None:
 def error_embed(color: int, message: str) -> disnake.Embed:
     return disnake.Embed(title="Error!", description=message, color=color)
 
-class DopplerDeckBot(commands.Bot):
-    def __init__(self, **kwargs):
+def profile_summary(path: str, top: int = PROFILE_TOP) -> str:
+    """Top functions by cumulative time from a saved cProfile file"""
+    stats = pstats.Stats(path).sort_stats(pstats.SortKey.CUMULATIVE)
+    lines = [f"{'cumtime':>8} {'tottime':>8} {'calls':>8}  function"]
+    for func in stats.fcn_list[:top]:
+        cc, nc, tt, ct, _ = stats.stats[func]
+        filename, line, name = func
+        where = f"{os.path.basename(filename)}:{line}({name})" if line else name
+        lines.append(f"{ct:8.3f} {tt:8.3f} {nc:8d}  {where[:60]}")
+    return "\n".join(lines)
+
+def _interaction_command_name(interaction) -> str | None:
+    """'music play' style name of an application command interaction, subcommands included"""
+    data = getattr(interaction, "data", None)
+    name = getattr(data, "name", None)
+    if not name:
+        return None
+    parts = [name]
+    options = getattr(data, "options", None) or []
+    while options and options[0].type in (disnake.OptionType.sub_command, disnake.OptionType.sub_command_group):
+        parts.append(options[0].name)
+        options = options[0].options or []
+    return " ".join(parts)
+
+class DopplerDeckBot(commands.AutoShardedBot):
+    def __init__(self, *, cluster_id: int | None = None, ipc_path: str | None = None, **kwargs):
         super().__init__(**kwargs)
+        self.cluster_id = cluster_id
+        self.ipc = ClusterIPCClient(ipc_path, cluster_id) if ipc_path and cluster_id is not None else None
+        # built in setup_hook and shared by the cogs, see database.get_restriction_db
+        self.restriction_db: RestrictionDB | None = None
+        self._cluster_totals: dict | None = None
+        self._presence_labels: dict[int, str] = {}
+        # shared by the bot and every cog for periodic and delayed work
+        self.timers = TimerWheel()
         self._presence_started = False
-        self._lavalink_started = False
-        self._boot_loaded = False
+        self._commands_synced = False
+        self._booted = False
+        self._boot_started = time.perf_counter()
+        self._lavalink_task: asyncio.Task | None = None
+        self.draining = False
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.metrics: MetricsServer | None = None
+        self.loop_monitor: LoopMonitor | None = None
+        self._profiling = False
+        GATEWAY_LATENCY.set_function(lambda: {(str(sid),): lat for sid, lat in self.latencies if math.isfinite(lat)})
 
-    async def on_ready(self):
-        log.info("Logged in as %s (%s) — in %d guild(s).", str(self.user), self.user.id if self.user else "unknown", len(self.guilds))
-        
+    async def invoke(self, ctx):
+        async with self._track_inflight(ctx.command.qualified_name if ctx.command else None, ctx.guild, "prefix"):
+            await super().invoke(ctx)
+
+    async def process_application_commands(self, interaction):
+        async with self._track_inflight(_interaction_command_name(interaction), interaction.guild, "slash"):
+            await super().process_application_commands(interaction)
+
+    @contextlib.asynccontextmanager
+    async def _track_inflight(self, command: str | None, guild=None, kind: str = "prefix"):
+        self._inflight += 1
+        self._idle.clear()
+        started = time.perf_counter()
         try:
-            db = RestrictionDB()
+            if command:
+                with get_tracer().trace(command, guild_id=getattr(guild, "id", 0) or 0, kind=kind):
+                    yield
+            else:
+                yield
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+            if command:
+                COMMAND_SECONDS.observe(time.perf_counter() - started, command=command)
+
+    async def shutdown(self):
+        """Drain and close: refuse new playback, let running commands finish,
+        let cogs flush their state, then close voice, Lavalink and the gateway."""
+        if self.draining:
+            return
+        self.draining = True
+        cfg = get_config()
+        deadline, notify, keep_players = cfg.shutdown_deadline, cfg.shutdown_notify, cfg.shutdown_keep_players
+        log.info("Draining (deadline %ds, notify=%s, keep players=%s)", deadline, notify, keep_players)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._drain(notify, keep_players), timeout=deadline)
+        except asyncio.TimeoutError:
+            log.warning("Drain deadline of %ds reached, closing anyway", deadline)
+        except Exception as exc:
+            log.error("Drain failed: %r", exc)
+        if keep_players:
+            # Client.close() would disconnect every player and end its Lavalink session;
+            # leave them for the next process to resume instead
+            self._connection._voice_clients.clear()
+        self.timers.close()
+        if self.loop_monitor is not None:
+            self.loop_monitor.stop()
+        await self._export_traces()
+        if self.metrics is not None:
+            await self.metrics.close()
+        if self.ipc is not None:
+            await self.ipc.close()
+        await self.close()
+        log.info("Shut down in %.0f ms", (time.perf_counter() - started) * 1000)
+
+    async def _drain(self, notify: bool, keep_players: bool):
+        if self._inflight:
+            log.info("Waiting for %d running command(s)", self._inflight)
+            await self._idle.wait()
+        for name, cog in list(self.cogs.items()):
+            hook = getattr(cog, "cog_drain", None)
+            if hook is None:
+                continue
+            try:
+                await hook(notify=notify, keep_players=keep_players)
+            except Exception as exc:
+                log.warning("Drain of %s failed: %r", name, exc)
+
+    async def login(self, token: str) -> None:
+        await super().login(token)
+        await self.setup_hook()
+
+    async def setup_hook(self):
+        """One-time boot work, run after login and before the gateway connects.
+
+        The database init and cog loading run side by side; Lavalink only needs
+        the gateway to be ready, so it is started here and finishes in the background.
+        """
+        if self._booted:
+            return
+        self._booted = True
+        started = time.perf_counter()
+        timings: dict[str, float] = {}
+
+        async def timed(name, coro):
+            t0 = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                timings[name] = (time.perf_counter() - t0) * 1000
+
+        self._lavalink_task = asyncio.create_task(self._connect_lavalink())
+        await self._start_metrics()
+        self._start_loop_monitor()
+        self._configure_tracing(get_config())
+        self._configure_rate_limits(get_config())
+        self.timers.call_every(TRACE_EXPORT_INTERVAL, self._export_traces)
+        db, _ = await asyncio.gather(
+            timed("database", asyncio.to_thread(RestrictionDB)),
+            timed("cogs", self._load_configured_extensions()),
+            return_exceptions=True,
+        )
+        if isinstance(db, Exception):
+            log.error("Database initialization failed: %r", db)
+        else:
+            self.restriction_db = db
             log.info("Database initialized successfully")
+        log.info(
+            "Startup: database %.0f ms, cogs %.0f ms, setup total %.0f ms (%.0f ms since bot start)",
+            timings.get("database", 0), timings.get("cogs", 0),
+            (time.perf_counter() - started) * 1000, (time.perf_counter() - self._boot_started) * 1000,
+        )
+
+    def _start_loop_monitor(self):
+        cfg = get_config()
+        if cfg.slow_callback_ms <= 0:
+            return
+        self.loop_monitor = LoopMonitor(interval=cfg.loop_sample_interval, threshold=cfg.slow_callback_ms / 1000)
+        self.loop_monitor.start()
+
+    def _configure_tracing(self, cfg):
+        try:
+            get_tracer().configure(cfg.trace_sample_rate, cfg.trace_keep, cfg.trace_export_path)
+        except Exception as exc:
+            log.warning("Invalid [tracing] config: %r", exc)
+
+    def _configure_rate_limits(self, cfg):
+        try:
+            get_limits().configure(cfg.rate_limits)
+        except Exception as exc:
+            log.warning("Invalid [ratelimit] config: %r", exc)
+
+    async def _export_traces(self):
+        tracer = get_tracer()
+        pending = tracer.take_pending()
+        if pending:
+            try:
+                await asyncio.to_thread(tracer.export, pending)
+            except Exception as exc:
+                log.warning("Trace export failed: %r", exc)
+
+    async def _start_metrics(self):
+        cfg = get_config()
+        if not cfg.metrics_enabled:
+            return
+        # clusters share a host, each one serves on its own port
+        port = cfg.metrics_port + (self.cluster_id or 0)
+        self.metrics = MetricsServer(host=cfg.metrics_host, port=port, path=cfg.metrics_path)
+        try:
+            await self.metrics.start()
+        except Exception as exc:
+            log.error("Metrics endpoint failed to start on port %d: %r", port, exc)
+            self.metrics = None
+
+    async def _load_configured_extensions(self):
+        try:
+            modules = get_config().modules
+        except Exception as exc:
+            log.error("Config load failure: %r", exc)
+            return
+        for mod in modules:
+            try:
+                self.load_extension(mod)
+                log.info("Loaded extension: %s", mod)
+            except Exception as exc:
+                log.warning("Failed to load %s: %r", mod, exc)
+
+    async def _connect_lavalink(self):
+        log.info("Lavalink config: identifier=%s host=%s port=%s secure=%s", NODE_CONFIG["identifier"], NODE_CONFIG["host"], NODE_CONFIG["port"], NODE_CONFIG["secure"])
+        t0 = time.perf_counter()
+        try:
+            node = await ensure_lavalink(self)
+            log.info("Lavalink connected: %s in %.0f ms (includes waiting for gateway ready)", node.label, (time.perf_counter() - t0) * 1000)
         except Exception as exc:
-            log.error("Database initialization failed: %r", exc)
-        
+            log.error("Lavalink connection failed: %r", exc)
+
+    async def on_ready(self):
+        log.info(
+            "Logged in as %s (%s) — in %d guild(s) across %d shard(s), ready %.0f ms after bot start.",
+            str(self.user), self.user.id if self.user else "unknown", len(self.guilds), self.shard_count or 1,
+            (time.perf_counter() - self._boot_started) * 1000,
+        )
         if not self._presence_started:
-            self.update_presence.start()
+            self.timers.call_every(20, self.update_presence)
             self._presence_started = True
             await self._refresh_presence()
-        if not self._lavalink_started:
-            log.info("Lavalink config: identifier=%s host=%s port=%s secure=%s", NODE_CONFIG["identifier"], NODE_CONFIG["host"], NODE_CONFIG["port"], NODE_CONFIG["secure"])
-            try:
-                node = await ensure_lavalink(self)
-                log.info("Lavalink connected: %s", node.label)
-            except Exception as exc:
-                log.error("Lavalink connection failed: %r", exc)
-            self._lavalink_started = True
-        if not self._boot_loaded:
+        # with several clusters the command tree is global, so only the first one syncs it
+        if not self._commands_synced and self.cluster_id in (None, 0):
+            self._commands_synced = True
             try:
-                cfg = load_config()
-                for mod in configured_modules(cfg):
-                    try:
-                        self.load_extension(mod)
-                        log.info("Loaded extension: %s", mod)
-                    except Exception as exc:
-                        log.warning("Failed to load %s: %r", mod, exc)
+                await self.sync_command_tree()
             except Exception as exc:
-                log.error("Config load failure: %r", exc)
-            self._boot_loaded = True
+                log.error("Application command sync failed: %r", exc)
+
+    def command_tree_hash(self) -> str:
+        """Stable hash of every registered application command plus the application id"""
+        bodies = sorted(
+            (cmd.body.to_dict() for cmd in self.application_commands_iterator()),
+            key=lambda d: (d.get("type", 1), d["name"]),
+        )
+        blob = json.dumps({"app": self.application_id, "commands": bodies}, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    async def sync_command_tree(self, force: bool = False) -> bool:
+        """Overwrite the global commands only when the tree changed since the last sync"""
+        digest = self.command_tree_hash()
+        try:
+            with open(COMMAND_HASH_PATH, "r", encoding="utf-8") as f:
+                stored = f.read().strip()
+        except FileNotFoundError:
+            stored = None
+        if not force and stored == digest:
+            log.info("Application commands unchanged (%s), skipping sync", digest[:12])
+            return False
+        await self.bulk_overwrite_global_commands([cmd.body for cmd in self.application_commands_iterator()])
+        with open(COMMAND_HASH_PATH, "w", encoding="utf-8") as f:
+            f.write(digest)
+        log.info("Synced application commands (%s)", digest[:12])
+        return True
+
+    async def on_shard_ready(self, shard_id: int):
+        log.info("Shard %d ready — %d guild(s).", shard_id, sum(1 for g in self.guilds if g.shard_id == shard_id))
+        if self._presence_started:
+            # a fresh IDENTIFY drops the presence we set on this shard
+            self._presence_labels.pop(shard_id, None)
+            await self._refresh_presence(shard_id=shard_id)
 
     async def on_voice_state_update(self, member, before, after):
         try:
@@ -107,36 +348,114 @@ class DopplerDeckBot(commands.Bot):
             log.warning("Error refreshing presence on voice_state_update: %r", exc)
 
     def _voice_connection_count(self) -> int:
+        if self._cluster_totals is not None:
+            # other clusters' connections plus our own live count
+            return self._cluster_totals["voice"] - self._cluster_totals["local_voice"] + len(self.voice_clients)
         return len(self.voice_clients)
 
-    async def _refresh_presence(self):
+    def local_stats(self) -> dict:
+        """Guild, member, voice and per-shard counts for this process"""
+        shards = {}
+        for sid, latency in self.latencies:
+            shards[sid] = {"guilds": 0, "latency": latency if math.isfinite(latency) else None}
+        members = 0
+        for g in self.guilds:
+            shards.setdefault(g.shard_id, {"guilds": 0, "latency": None})["guilds"] += 1
+            count = g.member_count
+            if count is None:
+                count = len(g.members)
+            members += int(count)
+        return {"guilds": len(self.guilds), "members": members, "voice": len(self.voice_clients), "shards": shards}
+
+    async def aggregate_stats(self) -> dict:
+        """Stats summed across every cluster, or just this process when not clustered"""
+        local = self.local_stats()
+        if self.ipc is None:
+            return local
+        try:
+            await self.ipc.publish(local)
+            totals = await self.ipc.aggregate()
+        except Exception as exc:
+            log.warning("Cluster IPC unavailable, using local stats: %r", exc)
+            return local
+        totals["local_voice"] = local["voice"]
+        self._cluster_totals = totals
+        return totals
+
+    async def _refresh_presence(self, shard_id: int | None = None, force: bool = False):
         count = self._voice_connection_count()
         label = f"in {count} voice channel{'s' if count != 1 else ''}"
-        activity = disnake.Activity(type=disnake.ActivityType.playing, name=label)
-        await self.change_presence(status=disnake.Status.online, activity=activity)
-        log.debug("Presence updated: playing %s", label)
+        total = self.shard_count or 1
+        targets = [shard_id] if shard_id is not None else sorted(self.shards)
+        for sid in targets:
+            shard_label = label if total <= 1 else f"{label} | shard {sid + 1}/{total}"
+            # presence updates are rate limited per shard, only send what changed
+            if not force and self._presence_labels.get(sid) == shard_label:
+                PRESENCE_UPDATES.inc(result="skipped")
+                continue
+            activity = disnake.Activity(type=disnake.ActivityType.playing, name=shard_label)
+            await self.change_presence(status=disnake.Status.online, activity=activity, shard_id=sid)
+            self._presence_labels[sid] = shard_label
+            PRESENCE_UPDATES.inc(result="sent")
+            log.debug("Presence updated on shard %d: playing %s", sid, shard_label)
 
-    @tasks.loop(seconds=20)
     async def update_presence(self):
         try:
+            # one stat() per tick; subscribers only hear about real edits
+            get_config().reload_if_changed()
+        except Exception as exc:
+            log.warning("Config reload failed: %r", exc)
+        try:
+            if self.ipc is not None:
+                await self.aggregate_stats()
             await self._refresh_presence()
         except Exception as exc:
             log.warning("Presence update failed: %r", exc)
 
-    @update_presence.before_loop
-    async def before_update_presence(self):
-        await self.wait_until_ready()
-
-def main():
-    intents = disnake.Intents.all()
+def main(cluster_id: int | None = None, shard_ids: list[int] | None = None, shard_count: int | None = None, ipc_path: str | None = None):
+    cfg = get_config()
+    # log output is written from a background thread from here on
+    setup_logging(cfg)
+    try:
+        profile = cfg.gateway_profile
+        gateway = gateway_options(profile, cfg.member_cache, cfg.chunk_guilds_at_startup)
+    except Exception as exc:
+        log.error("Invalid [gateway] config, falling back to the full profile: %r", exc)
+        profile = "full"
+        gateway = gateway_options(profile)
+    log.info("Gateway profile %s: intents=%s member_cache=%s chunking=%s", profile, gateway["intents"].value, gateway["member_cache_flags"].value, gateway["chunk_guilds_at_startup"])
+    if shard_ids is None:
+        try:
+            shard_count = cfg.shard_count
+        except Exception as exc:
+            log.error("Config load failure: %r", exc)
+            shard_count = None
+    else:
+        log.info("Cluster %s starting shards %s of %d", cluster_id, shard_ids, shard_count)
+    # disnake binds the bot to this loop and starts its shard workers on it, so it is the one that has to run
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     bot = DopplerDeckBot(
+        loop=loop,
         command_prefix=">",
-        intents=intents,
+        owner_id=OWNER_ID,
+        **gateway,
+        shard_count=shard_count,
+        shard_ids=shard_ids,
+        cluster_id=cluster_id,
+        ipc_path=ipc_path,
         allowed_mentions=disnake.AllowedMentions.none(),
-        command_sync_flags=commands.CommandSyncFlags.default(),
+        # syncing is hash-gated in DopplerDeckBot.sync_command_tree instead of on every connect
+        command_sync_flags=commands.CommandSyncFlags.none(),
         help_command=None
     )
 
+    get_config().subscribe(lambda cfg: bot.dispatch("config_reload", cfg))
+    get_config().subscribe(bot._configure_tracing)
+    get_config().subscribe(bot._configure_rate_limits)
+    get_config().subscribe(apply_levels)
+    watch_rate_limits()
+
     def is_owner_ctx(ctx):
         return ctx.author and ctx.author.id == OWNER_ID
 
@@ -144,9 +463,10 @@ def main():
     @commands.check(is_owner_ctx)
     async def _refresh(ctx, module: str):
         try:
-            cfg = load_config()
-            color = embed_color_from(cfg)
-            mods = configured_modules(cfg)
+            cfg = get_config()
+            cfg.reload_if_changed()
+            color = cfg.embed_color
+            mods = cfg.modules
             target = normalize_target(module, mods)
             if not target:
                 msg = f"Command raised an exception: ModuleNotFoundError: No module named '{module}'"
@@ -154,15 +474,16 @@ def main():
                 return
             try:
                 bot.reload_extension(target)
+                await bot.sync_command_tree()
                 await ctx.send(f"refreshed: {target}")
             except Exception as exc:
                 msg = f"Command raised an exception: {exc.__class__.__name__}: {exc}"
                 await ctx.send(embed=error_embed(color, msg))
         except Exception as exc:
             try:
-                color = embed_color_from(load_config())
+                color = get_config().embed_color
             except Exception:
-                color = 0x8BC6E8
+                color = DEFAULT_EMBED_COLOR
             msg = f"Command raised an exception: {exc.__class__.__name__}: {exc}"
             await ctx.send(embed=error_embed(color, msg))
 
@@ -170,9 +491,10 @@ def main():
     @commands.check(is_owner_ctx)
     async def _load(ctx, module: str):
         try:
-            cfg = load_config()
-            color = embed_color_from(cfg)
-            mods = configured_modules(cfg)
+            cfg = get_config()
+            cfg.reload_if_changed()
+            color = cfg.embed_color
+            mods = cfg.modules
             target = normalize_target(module, mods)
             if not target:
                 msg = f"Command raised an exception: ModuleNotFoundError: No module named '{module}'"
@@ -180,6 +502,7 @@ def main():
                 return
             try:
                 bot.load_extension(target)
+                await bot.sync_command_tree()
                 await ctx.send(f"loaded {target}")
             except commands.ExtensionAlreadyLoaded:
                 await ctx.send(f"already loaded {target}")
@@ -188,13 +511,79 @@ def main():
                 await ctx.send(embed=error_embed(color, msg))
         except Exception as exc:
             try:
-                color = embed_color_from(load_config())
+                color = get_config().embed_color
             except Exception:
-                color = 0x8BC6E8
+                color = DEFAULT_EMBED_COLOR
+            msg = f"Command raised an exception: {exc.__class__.__name__}: {exc}"
+            await ctx.send(embed=error_embed(color, msg))
+
+    @bot.command(name="profile")
+    @commands.check(is_owner_ctx)
+    async def _profile(ctx, seconds: float = 10.0):
+        color = get_config().embed_color
+        seconds = max(1.0, min(seconds, PROFILE_MAX_SECONDS))
+        if bot._profiling:
+            await ctx.send(embed=error_embed(color, "A profile is already running."))
+            return
+        bot._profiling = True
+        # everything on the event loop runs on this thread, so this covers every cog and task
+        profiler = cProfile.Profile()
+        try:
+            await ctx.send(f"profiling the event loop for {seconds:g}s")
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+            await asyncio.to_thread(profiler.dump_stats, path)
+            summary = await asyncio.to_thread(profile_summary, path)
+            await ctx.send(
+                embed=disnake.Embed(
+                    title=f"Profile ({seconds:g}s)",
+                    description=f"```\n{summary[:3900]}\n```",
+                    color=color,
+                ).set_footer(text=f"Saved to {path}")
+            )
+        except Exception as exc:
             msg = f"Command raised an exception: {exc.__class__.__name__}: {exc}"
             await ctx.send(embed=error_embed(color, msg))
+        finally:
+            bot._profiling = False
 
-    bot.run(get_token())
+    @bot.command(name="sync")
+    @commands.check(is_owner_ctx)
+    async def _sync(ctx):
+        try:
+            await bot.sync_command_tree(force=True)
+            await ctx.send(f"synced {len(bot.application_commands)} application commands")
+        except Exception as exc:
+            color = get_config().embed_color
+            msg = f"Command raised an exception: {exc.__class__.__name__}: {exc}"
+            await ctx.send(embed=error_embed(color, msg))
+
+    async def runner():
+        try:
+            await bot.start(get_token())
+        finally:
+            if not bot.is_closed():
+                await bot.close()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(bot.shutdown()))
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C still stops the bot, just without draining
+    try:
+        loop.run_until_complete(runner())
+    finally:
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
 
 if __name__ == "__main__":
     main()
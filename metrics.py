@@ -0,0 +1,247 @@
+import bisect
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+log = logging.getLogger("DopplerDeck.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUEUE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _labels(names: Tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    parts = ['%s="%s"' % (n, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time through ``set_function``"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelKey, float] = {}
+        self._fn: Optional[Callable[[], Dict[LabelKey, float]]] = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def set_function(self, fn: Optional[Callable[[], Dict[LabelKey, float]]]):
+        self._fn = fn
+
+    def _samples(self) -> List[str]:
+        values = dict(self._values)
+        if self._fn is not None:
+            try:
+                values.update(self._fn())
+            except Exception as exc:
+                log.warning("Collecting %s failed: %r", self.name, exc)
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative buckets per label set.
+
+    ``set_function`` turns it into a snapshot: the observations are recomputed
+    on every scrape (e.g. the current queue length of every guild).
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # per-bucket counts incl. +Inf, count, sum
+        self._fn: Optional[Callable[[], Iterable[float]]] = None
+
+    def observe(self, value: float, **labels):
+        self._add(self._series, self._key(labels), value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def set_function(self, fn: Optional[Callable[[], Iterable[float]]]):
+        self._fn = fn
+
+    def _add(self, series: Dict[LabelKey, List[float]], key: LabelKey, value: float):
+        row = series.get(key)
+        if row is None:
+            row = series[key] = [0.0] * (len(self.buckets) + 3)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-2] += 1
+        row[-1] += value
+
+    def _samples(self) -> List[str]:
+        series = self._series
+        if self._fn is not None:
+            series = {}
+            try:
+                for value in self._fn():
+                    self._add(series, (), value)
+            except Exception as exc:
+                log.warning("Collecting %s failed: %r", self.name, exc)
+        out = []
+        for key, row in series.items():
+            running = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), row):
+                running += count
+                le = 'le="%s"' % _fmt(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(running)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(row[-2])}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(row[-1])}")
+        return out
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+COMMAND_SECONDS = Histogram("dopplerdeck_command_seconds", "Command handling time", ["command"])
+FETCH_TRACKS_SECONDS = Histogram("dopplerdeck_fetch_tracks_seconds", "Lavalink track loading time", ["source"])
+FETCH_TRACKS_CACHE = Counter("dopplerdeck_fetch_tracks_cache_total", "Track search cache lookups", ["result"])
+MYSQL_QUERY_SECONDS = Histogram("dopplerdeck_mysql_query_seconds", "Restriction database query time", ["query"])
+ACTIVE_PLAYERS = Gauge("dopplerdeck_active_players", "Connected players per Lavalink node", ["node"])
+QUEUE_LENGTH = Histogram("dopplerdeck_queue_length", "Queued tracks per active guild", buckets=QUEUE_BUCKETS)
+GATEWAY_LATENCY = Gauge("dopplerdeck_gateway_latency_seconds", "Heartbeat latency per shard", ["shard"])
+PRESENCE_UPDATES = Counter("dopplerdeck_presence_updates_total", "Presence updates sent or skipped as unchanged", ["result"])
+RATE_LIMIT_HITS = Counter("dopplerdeck_rate_limit_hits_total", "Rate limits hit on Discord", ["kind"])
+COMMAND_RATE_LIMITED = Counter("dopplerdeck_command_rate_limited_total", "Commands refused by the per-user / per-guild limits", ["command", "scope"])
+LOOP_LAG = Histogram("dopplerdeck_loop_lag_seconds", "How late the event loop ran a scheduled tick")
+SLOW_CALLBACKS = Counter("dopplerdeck_slow_callbacks_total", "Times a callback blocked the event loop past the threshold")
+LOG_RECORDS_DROPPED = Counter("dopplerdeck_log_records_dropped_total", "Log records dropped as repeats or because the log queue was full", ["reason"])
+
+
+class _RateLimitFilter(logging.Filter):
+    """Counts the rate limit warnings disnake logs; never drops a record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        msg = str(record.msg)
+        if msg.startswith("We are being rate limited"):
+            RATE_LIMIT_HITS.inc(kind="rest")
+        elif msg.startswith("Global rate limit has been hit"):
+            RATE_LIMIT_HITS.inc(kind="rest_global")
+        elif "is ratelimited" in msg:
+            RATE_LIMIT_HITS.inc(kind="gateway")
+        return True
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process; 0 where neither /proc nor psutil is available"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil  # non-Linux fallback
+    except ImportError:
+        return 0
+    return psutil.Process().memory_info().rss
+
+
+def watch_rate_limits():
+    flt = _RateLimitFilter()
+    for name in ("disnake.http", "disnake.gateway"):
+        logger = logging.getLogger(name)
+        if not any(isinstance(f, _RateLimitFilter) for f in logger.filters):
+            logger.addFilter(flt)
+
+
+class MetricsServer:
+    """Serves the registry in the Prometheus text format"""
+
+    def __init__(self, *, host: str = "127.0.0.1", port: int = 9100, path: str = "/metrics"):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get(self.path, self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            site = web.TCPSite(runner, self.host, self.port)
+            await site.start()
+        except Exception:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+        log.info("Metrics on http://%s:%d%s", self.host, self.port, self.path)
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"})
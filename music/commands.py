@@ -1,23 +1,29 @@
 import asyncio
 import datetime as dt
+import logging
+import time
 import disnake
 import mafic
 from disnake.ext import commands
-from typing import Optional, Deque, Dict, List, NamedTuple
-from collections import deque
+from typing import Optional, Deque, Dict, List, NamedTuple, Set
+from collections import OrderedDict, deque
 from urllib.parse import urlparse
 import os
 import subprocess
-try:
-    import tomllib as toml
-except ModuleNotFoundError:
-    import tomli as toml
 
 
 from lavalink import ensure_lavalink
-from database import RestrictionDB
-
-CONFIG_PATH = "config.toml"
+from database import get_restriction_db
+from config import get_config
+from music.reaper import IdleReaper
+from music.nowplaying import EditScheduler
+from music.snapshots import SessionSnapshot, SessionStore
+from timers import Timer
+from tracing import span, traced
+from ratelimit import denial_message, get_limits
+from metrics import ACTIVE_PLAYERS, FETCH_TRACKS_CACHE, FETCH_TRACKS_SECONDS, QUEUE_LENGTH
+
+log = logging.getLogger("DopplerDeck.music")
 
 RADIO_STATIONS = {
     "capital xtra": {
@@ -44,10 +50,12 @@ RADIO_STATIONS = {
 }
 
 
-def _load_color() -> int:
-    with open(CONFIG_PATH, "rb") as f:
-        cfg = toml.load(f)
-    return int(cfg.get("embed color", 0x8BC6E8))
+# snapshots older than this are from a session nobody is waiting on any more
+SNAPSHOT_MAX_AGE = 3600
+DECODE_BATCH = 500
+# repeated searches and links are answered from memory for a while
+SEARCH_CACHE_TTL = 600
+SEARCH_CACHE_SIZE = 1000
 
 
 def _fmt_ms(ms: Optional[int]) -> str:
@@ -135,28 +143,178 @@ class QItem(NamedTuple):
 class Music(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.color = _load_color()
+        self.color = get_config().embed_color
         self.node = None
         self._players: Dict[int, mafic.Player] = {}
         self._vc_map: Dict[int, int] = {}
+        # user ids of the listeners in the player's channel, bots excluded
+        self._humans: Dict[int, Set[int]] = {}
         self._queues: Dict[int, Deque[QItem]] = {}
         self._current: Dict[int, Optional[mafic.Track]] = {}
         self._current_req: Dict[int, Optional[int]] = {}
         self._last: Dict[int, Optional[mafic.Track]] = {}
-        self._synced = False
-        self.db = RestrictionDB()
         self._last_text_channel: Dict[int, Optional[disnake.TextChannel]] = {}
         self._stopped: Dict[int, bool] = {}
         self._intro_played: Dict[int, bool] = {}
+        cfg = get_config()
+        self.reaper = IdleReaper(cfg.idle_timeout, cfg.paused_timeout)
+        self._reaper_timer = bot.timers.call_every(30, self.reap_idle_players)
+        # one now playing message per guild, edited in place on track change
+        self._np_messages: Dict[int, disnake.Message] = {}
+        self._np_timers: Dict[int, Timer] = {}
+        self._np_progress = cfg.now_playing_progress
+        self._np_refresh = cfg.now_playing_refresh
+        self.np_edits = EditScheduler(bot.timers)
+        # sessions are snapshotted to disk so a restart can pick them back up
+        self.sessions = SessionStore(cfg.snapshot_path)
+        self._sessions_closed = False
+        self._dirty: set = set()
+        self._restored = False
+        self._resumed: set = set()
+        self._snapshot_timer = bot.timers.call_every(cfg.snapshot_interval, self.flush_snapshots)
+        self._search_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        ACTIVE_PLAYERS.set_function(self._players_per_node)
+        QUEUE_LENGTH.set_function(lambda: [len(self._queues.get(gid, ())) for gid in self._players])
+
+    @property
+    def db(self):
+        # resolved on use, the cog loads while setup_hook is still connecting the database
+        return get_restriction_db(self.bot)
+
+    async def cog_load(self):
+        # a reloaded cog starts out empty, the players still live on Lavalink carry on under it
+        for node in mafic.NodePool.nodes:
+            if self.node is None:
+                self.node = node
+            self._adopt_players(node)
+        # only the startup restore reads this
+        self._resumed.clear()
+
+    def cog_unload(self):
+        self._reaper_timer.cancel()
+        self._snapshot_timer.cancel()
+        ACTIVE_PLAYERS.set_function(None)
+        QUEUE_LENGTH.set_function(None)
+        for timer in self._np_timers.values():
+            timer.cancel()
+        self._np_timers.clear()
+        if not self._sessions_closed:
+            asyncio.ensure_future(self._close_sessions())
+
+    async def _close_sessions(self):
+        # pending snapshots go to disk before the connection is closed
+        self._sessions_closed = True
+        await self.flush_snapshots()
+        await asyncio.to_thread(self.sessions.close)
+
+    async def reap_idle_players(self):
+        sessions = []
+        for gid, player in list(self._players.items()):
+            sessions.append((gid, getattr(player, "current", None) is not None, getattr(player, "paused", False)))
+        for gid in self.reaper.expired(sessions):
+            guild = self.bot.get_guild(gid)
+            if guild is None:
+                self._forget_guild(gid)
+            else:
+                await self._disconnect(guild)
+            self.reaper.reclaimed += 1
+            log.info("Reclaimed idle player in guild %s (%d reclaimed so far)", gid, self.reaper.reclaimed)
+
+    async def cog_drain(self, notify: bool, keep_players: bool):
+        """Called by DopplerDeckBot.shutdown once no commands are running"""
+        self._reaper_timer.cancel()
+        self._snapshot_timer.cancel()
+        players = list(self._players.items())
+        if notify and players:
+            desc = "Playback will pick up where it left off in a moment." if keep_players else "Playback is stopping, your queue is saved for when I'm back."
+            embed = disnake.Embed(title="Restarting", description=desc, color=self.color)
+            channels = [self._last_text_channel.get(gid) for gid, _ in players]
+            await asyncio.gather(*(ch.send(embed=embed) for ch in channels if ch is not None), return_exceptions=True)
+        # the final positions go to disk before anything is torn down
+        await self._close_sessions()
+        if not keep_players:
+            for _, player in players:
+                try:
+                    await player.disconnect(force=True)
+                except Exception:
+                    pass
+        if self.node is not None:
+            await self.node.close()
+        log.info("Music drained: %d player(s) %s", len(players), "left for resume" if keep_players else "disconnected")
+
+    async def _reject_if_draining(self, target) -> bool:
+        if not getattr(self.bot, "draining", False):
+            return False
+        embed = disnake.Embed(title="Restarting", description="I'm restarting right now, try again in a moment.", color=self.color)
+        if isinstance(target, disnake.ApplicationCommandInteraction):
+            await target.response.send_message(embed=embed, ephemeral=True)
+        else:
+            await target.send(embed=embed)
+        return True
+
+    def _search_cached(self, query: str, search_type=mafic.SearchType.YOUTUBE) -> bool:
+        hit = self._search_cache.get((query, getattr(search_type, "value", search_type) or "url"))
+        return hit is not None and hit[0] > time.monotonic()
+
+    async def _reject_if_limited(self, target, command: str, query: str, search_type=mafic.SearchType.YOUTUBE) -> bool:
+        """Searches that reach Lavalink spend a token from the user's and the guild's bucket; cache hits are free"""
+        if self._search_cached(query, search_type):
+            return False
+        denied = get_limits().check(command, target.author.id, getattr(target.guild, "id", None))
+        if denied is None:
+            return False
+        embed = disnake.Embed(title="Slow down", description=denial_message(command, *denied), color=self.color)
+        if isinstance(target, disnake.ApplicationCommandInteraction):
+            await target.response.send_message(embed=embed, ephemeral=True)
+        else:
+            await target.send(embed=embed)
+        return True
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, cfg):
+        self.color = cfg.embed_color
+        self.reaper.idle_timeout = cfg.idle_timeout
+        self.reaper.paused_timeout = cfg.paused_timeout
+        self._np_progress = cfg.now_playing_progress
+        self._np_refresh = cfg.now_playing_refresh
 
     async def _ensure_node(self):
         if self.node is None:
             self.node = await ensure_lavalink(self.bot)
 
+    def _players_per_node(self) -> Dict[tuple, int]:
+        counts: Dict[tuple, int] = {}
+        for player in self._players.values():
+            node = getattr(player, "_node", None)
+            key = (getattr(node, "label", "unknown"),)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    async def _fetch_tracks(self, player: mafic.Player, query: str, search_type=mafic.SearchType.YOUTUBE):
+        source = getattr(search_type, "value", search_type) or "url"
+        key = (query, source)
+        now = time.monotonic()
+        hit = self._search_cache.get(key)
+        if hit is not None and hit[0] > now:
+            self._search_cache.move_to_end(key)
+            FETCH_TRACKS_CACHE.inc(result="hit")
+            with span("fetch_tracks", source=source, cache="hit"):
+                return hit[1]
+        FETCH_TRACKS_CACHE.inc(result="miss")
+        with FETCH_TRACKS_SECONDS.time(source=source), span("fetch_tracks", source=source, cache="miss"):
+            results = await player.fetch_tracks(query, search_type=search_type)
+        if results:
+            self._search_cache[key] = (now + SEARCH_CACHE_TTL, results)
+            self._search_cache.move_to_end(key)
+            while len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return results
+
     def _author_channel(self, author: disnake.Member) -> Optional[disnake.VoiceChannel]:
         vs = getattr(author, "voice", None)
         return getattr(vs, "channel", None)
     
+    @traced("restriction check")
     def _check_restriction(self, guild: disnake.Guild, channel: disnake.VoiceChannel) -> bool:
         if not self.db.has_restriction(guild.id):
             return True
@@ -166,6 +324,7 @@ class Music(commands.Cog):
     def _get_player(self, guild: disnake.Guild) -> Optional[mafic.Player]:
         return self._players.get(guild.id)
 
+    @traced("voice connect")
     async def _connect(self, guild: disnake.Guild, channel: disnake.VoiceChannel):
         await self._ensure_node()
         player: mafic.Player = await channel.connect(cls=mafic.Player)
@@ -174,10 +333,12 @@ class Music(commands.Cog):
             try:
                 await me.edit(deafen=True)
             except Exception as e:
-                print(f"Failed to deafen bot: {e}")
+                log.warning("Failed to deafen bot in guild %s: %r", guild.id, e)
         self._players[guild.id] = player
         self._vc_map[guild.id] = channel.id
+        self._seed_humans(guild, channel)
         self._queues.setdefault(guild.id, deque())
+        self.reaper.touch(guild.id)
 
     async def _disconnect(self, guild: disnake.Guild):
         player = self._players.get(guild.id)
@@ -189,15 +350,39 @@ class Music(commands.Cog):
                     await player.destroy()
                 except Exception:
                     pass
-        self._players.pop(guild.id, None)
-        self._vc_map.pop(guild.id, None)
-        self._queues.pop(guild.id, None)
-        self._current.pop(guild.id, None)
-        self._current_req.pop(guild.id, None)
-        self._last.pop(guild.id, None)
-        self._last_text_channel.pop(guild.id, None)
-        self._stopped.pop(guild.id, None)
-        self._intro_played.pop(guild.id, None)
+        self._forget_guild(guild.id)
+
+    def _forget_guild(self, guild_id: int):
+        self._players.pop(guild_id, None)
+        self._vc_map.pop(guild_id, None)
+        self._humans.pop(guild_id, None)
+        self._queues.pop(guild_id, None)
+        self._current.pop(guild_id, None)
+        self._current_req.pop(guild_id, None)
+        self._last.pop(guild_id, None)
+        self._last_text_channel.pop(guild_id, None)
+        self._stopped.pop(guild_id, None)
+        self._intro_played.pop(guild_id, None)
+        self.reaper.forget(guild_id)
+        self._resumed.discard(guild_id)
+        self._np_messages.pop(guild_id, None)
+        timer = self._np_timers.pop(guild_id, None)
+        if timer:
+            timer.cancel()
+        self.np_edits.forget(guild_id)
+        self._dirty.add(guild_id)
+
+    def _seed_humans(self, guild: disnake.Guild, channel: disnake.VoiceChannel):
+        # one scan at connect time, voice state updates keep the set after that;
+        # members missing from the cache are counted as humans so we never leave early
+        humans = set()
+        for user_id in channel.voice_states:
+            if self.bot.user and user_id == self.bot.user.id:
+                continue
+            m = guild.get_member(user_id)
+            if m is None or not m.bot:
+                humans.add(user_id)
+        self._humans[guild.id] = humans
 
     async def _check_empty_and_leave(self, guild: disnake.Guild):
         chan_id = self._vc_map.get(guild.id)
@@ -207,19 +392,160 @@ class Music(commands.Cog):
         if not isinstance(chan, disnake.VoiceChannel):
             await self._disconnect(guild)
             return
-        humans = [m for m in chan.members if not m.bot]
-        if len(humans) == 0:
+        if not self._humans.get(guild.id):
             await self._disconnect(guild)
 
+    @traced("enqueue")
     def _enqueue(self, guild_id: int, track: mafic.Track, requester_id: Optional[int]) -> int:
         q = self._queues.setdefault(guild_id, deque())
         q.append(QItem(track=track, requester_id=requester_id))
+        self._dirty.add(guild_id)
         return len(q)
 
+    def _snapshot(self, gid: int) -> Optional[SessionSnapshot]:
+        player = self._players.get(gid)
+        vc_id = self._vc_map.get(gid)
+        if player is None or vc_id is None:
+            return None
+        current = getattr(player, "current", None)
+        text_channel = self._last_text_channel.get(gid)
+        return SessionSnapshot(
+            guild_id=gid,
+            voice_channel_id=vc_id,
+            text_channel_id=getattr(text_channel, "id", None),
+            current=current.id if current else None,
+            current_requester_id=self._current_req.get(gid),
+            position=int(getattr(player, "position", 0) or 0) if current else 0,
+            queue=[(item.track.id, item.requester_id) for item in self._queues.get(gid, ())],
+        )
+
+    async def flush_snapshots(self):
+        """Write changed sessions in one batch, and only positions for the rest"""
+        dirty, self._dirty = self._dirty, set()
+        upserts, deletes, positions = [], [], []
+        for gid in dirty:
+            snap = self._snapshot(gid)
+            if snap is None or (snap.current is None and not snap.queue):
+                deletes.append(gid)
+            else:
+                upserts.append(snap)
+        for gid, player in self._players.items():
+            if gid not in dirty and getattr(player, "current", None) is not None:
+                positions.append((gid, int(getattr(player, "position", 0) or 0)))
+        if not (upserts or deletes or positions):
+            return
+        try:
+            await asyncio.to_thread(self.sessions.write, upserts, positions, deletes)
+        except Exception as e:
+            self._dirty |= dirty
+            log.warning("Session snapshot write failed: %r", e)
+
+    def _adopt_players(self, node: mafic.Node) -> List[int]:
+        """Take over players Lavalink kept alive for a resumed session"""
+        adopted = []
+        for player in node.players:
+            guild = getattr(player, "guild", None)
+            channel = getattr(player, "channel", None)
+            if guild is None or channel is None or guild.id in self._players:
+                continue
+            self._players[guild.id] = player
+            self._vc_map[guild.id] = channel.id
+            self._seed_humans(guild, channel)
+            self._queues.setdefault(guild.id, deque())
+            current = getattr(player, "current", None)
+            if current is not None:
+                self._current[guild.id] = current
+                self._last[guild.id] = current
+            self.reaper.touch(guild.id)
+            self._resumed.add(guild.id)
+            adopted.append(guild.id)
+        if adopted:
+            log.info("Adopted %d player(s) from the resumed Lavalink session", len(adopted))
+        return adopted
+
+    @commands.Cog.listener()
+    async def on_node_ready(self, node: mafic.Node):
+        self._adopt_players(node)
+
+    async def _restore_sessions(self):
+        snapshots = await asyncio.to_thread(self.sessions.load, SNAPSHOT_MAX_AGE)
+        snapshots = [s for s in snapshots if self.bot.get_guild(s.guild_id)]
+        if not snapshots:
+            return
+        await self._ensure_node()
+        # players that survived the restart on Lavalink keep playing, they only need their queue back
+        self._adopt_players(self.node)
+        resumed, self._resumed = self._resumed, set()
+        snapshots = [s for s in snapshots if s.guild_id not in self._players or s.guild_id in resumed]
+        if not snapshots:
+            return
+        # decode every stored track in a few batched REST calls instead of searching again
+        encoded = list({t for s in snapshots for t in ([s.current] if s.current and s.guild_id not in resumed else []) + [e for e, _ in s.queue]})
+        decoded: Dict[str, mafic.Track] = {}
+        for i in range(0, len(encoded), DECODE_BATCH):
+            chunk = encoded[i:i + DECODE_BATCH]
+            try:
+                tracks = await self.node.decode_tracks(chunk)
+            except Exception as e:
+                log.warning("Decoding %d stored tracks failed: %r", len(chunk), e)
+                continue
+            decoded.update(zip(chunk, tracks))
+
+        restored = 0
+        for snap in snapshots:
+            guild = self.bot.get_guild(snap.guild_id)
+            if snap.guild_id in resumed:
+                self._last_text_channel[guild.id] = guild.get_channel(snap.text_channel_id) if snap.text_channel_id else None
+                self._current_req[guild.id] = snap.current_requester_id
+                for enc, requester_id in snap.queue:
+                    track = decoded.get(enc)
+                    if track is not None:
+                        self._enqueue(guild.id, track, requester_id)
+                restored += 1
+                continue
+            channel = guild.get_channel(snap.voice_channel_id)
+            if not isinstance(channel, disnake.VoiceChannel):
+                self._dirty.add(snap.guild_id)
+                continue
+            if not any(uid != self.bot.user.id for uid in channel.voice_states):
+                # nobody is left listening
+                self._dirty.add(snap.guild_id)
+                continue
+            try:
+                await self._connect(guild, channel)
+            except Exception as e:
+                log.warning("Could not rejoin %s in guild %s: %r", channel.id, guild.id, e)
+                continue
+            text_channel = guild.get_channel(snap.text_channel_id) if snap.text_channel_id else None
+            self._last_text_channel[guild.id] = text_channel
+            for enc, requester_id in snap.queue:
+                track = decoded.get(enc)
+                if track is not None:
+                    self._enqueue(guild.id, track, requester_id)
+            player = self._players[guild.id]
+            current = decoded.get(snap.current) if snap.current else None
+            if current is not None:
+                await self._play_track(player, current, text_channel, snap.current_requester_id, start_time=snap.position)
+            else:
+                await self._play_next_or_autoplay(player)
+            restored += 1
+        log.info("Restored %d of %d snapshotted session(s)", restored, len(snapshots))
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self._restored:
+            return
+        self._restored = True
+        try:
+            await self._restore_sessions()
+        except Exception as e:
+            log.warning("Session restore failed: %r", e)
+
+    @traced("intro")
     async def _play_intro_disnake(self, channel: disnake.VoiceChannel):
         intro_file = os.getenv("INTRO_FILE", "botintro.wav")
         if not os.path.exists(intro_file):
-            print(f"[intro] File not found: {intro_file}")
+            log.warning("Intro file not found: %s", intro_file)
             return
 
         # 1) Connect natively (NOT Lavalink)
@@ -236,7 +562,7 @@ class Music(commands.Cog):
             for _ in range(100):
                 if not vc.is_playing():
                     break
-                await asyncio.sleep(0.1)
+                await self.bot.timers.sleep(0.1)
         finally:
             try:
                 await vc.disconnect(force=True)
@@ -244,30 +570,71 @@ class Music(commands.Cog):
                 pass
 
         # 2) Cool-down: give Discord time to release the old voice session
-        await asyncio.sleep(0.5)
+        await self.bot.timers.sleep(0.5)
 
         # 3) Extra safety: wait until guild.voice_client is really None
         for _ in range(20):  # up to ~2s
             if channel.guild.voice_client is None:
                 break
-            await asyncio.sleep(0.1)
+            await self.bot.timers.sleep(0.1)
 
 
 
-    async def _play_track(self, player: mafic.Player, track: mafic.Track, text_channel, requester_id: Optional[int] = None):
+    @traced("play")
+    async def _play_track(self, player: mafic.Player, track: mafic.Track, text_channel, requester_id: Optional[int] = None, start_time: int = 0):
         gid = player.guild.id
-        await player.play(track, start_time=0)
+        await player.play(track, start_time=start_time)
+        self.reaper.touch(gid)
         self._current[gid] = track
         self._current_req[gid] = requester_id
         self._last[gid] = track
-        try:
-            embed = self._now_playing_embed(player.guild)
-            await text_channel.send(embed=embed)
-        except Exception as e:
-            print(f"Failed to send now playing message: {e}")
+        self._dirty.add(gid)
+        await self._show_now_playing(player.guild, text_channel)
+
+    @traced("embed send")
+    async def _show_now_playing(self, guild: disnake.Guild, text_channel):
+        gid = guild.id
+        msg = self._np_messages.get(gid)
+        if msg is not None and text_channel is not None and msg.channel.id == text_channel.id:
+            self._schedule_np_edit(guild, msg)
+        elif text_channel is not None:
+            try:
+                self._np_messages[gid] = await text_channel.send(embed=self._now_playing_embed(guild, progress=self._np_progress))
+            except Exception as e:
+                log.warning("Failed to send now playing message in guild %s: %r", gid, e)
+        if self._np_progress and gid not in self._np_timers:
+            self._np_timers[gid] = self.bot.timers.call_every(self._np_refresh, self._tick_progress, gid)
+
+    def _schedule_np_edit(self, guild: disnake.Guild, msg: disnake.Message):
+        async def edit():
+            # rendered when the edit goes out so queued updates show the latest state
+            if self._np_messages.get(guild.id) is not msg:
+                return
+            try:
+                await msg.edit(embed=self._now_playing_embed(guild, progress=self._np_progress))
+            except disnake.NotFound:
+                # deleted by someone, the next track posts a fresh one
+                self._np_messages.pop(guild.id, None)
+
+        self.np_edits.submit(msg.channel.id, guild.id, edit)
+
+    def _tick_progress(self, gid: int):
+        player = self._players.get(gid)
+        msg = self._np_messages.get(gid)
+        if not self._np_progress or player is None or msg is None:
+            timer = self._np_timers.pop(gid, None)
+            if timer:
+                timer.cancel()
+            return
+        track = getattr(player, "current", None)
+        if track is None or getattr(track, "stream", False) or getattr(player, "paused", False):
+            return
+        self._schedule_np_edit(player.guild, msg)
 
     async def _play_next_or_autoplay(self, player: mafic.Player):
         gid = player.guild.id
+        # the idle grace period starts when the previous track ends
+        self.reaper.touch(gid)
         q = self._queues.get(gid)
 
         if q and len(q) > 0:
@@ -285,7 +652,7 @@ class Music(commands.Cog):
             query = _yt_search_query_from_track(seed)
             if query:
                 try:
-                    yt_results = await player.fetch_tracks(query, search_type=mafic.SearchType.YOUTUBE)
+                    yt_results = await self._fetch_tracks(player, query, search_type=mafic.SearchType.YOUTUBE)
                 except Exception:
                     yt_results = None
 
@@ -302,7 +669,7 @@ class Music(commands.Cog):
         if ident:
             url = f"https://www.youtube.com/watch?v={ident}&list=RD{ident}"
             try:
-                results = await player.fetch_tracks(url, search_type=mafic.SearchType.YOUTUBE)
+                results = await self._fetch_tracks(player, url, search_type=mafic.SearchType.YOUTUBE)
             except Exception:
                 results = None
 
@@ -329,7 +696,7 @@ class Music(commands.Cog):
         filled = min(max(filled, 0), width)
         return "█" * filled + "─" * (width - filled)
 
-    def _now_playing_embed(self, guild: disnake.Guild) -> disnake.Embed:
+    def _now_playing_embed(self, guild: disnake.Guild, progress: bool = False) -> disnake.Embed:
         player = self._players.get(guild.id)
         track = getattr(player, "current", None) if player else None
         if not track:
@@ -356,6 +723,10 @@ class Music(commands.Cog):
         if vol is not None:
             emb.add_field(name="Volume", value=f"{vol}%", inline=True)
         emb.add_field(name="Source", value=_source_name(uri), inline=True)
+        length = getattr(track, "length", None)
+        if progress and not is_radio and not getattr(track, "stream", False):
+            pos = getattr(player, "position", 0) or 0
+            emb.add_field(name="Progress", value=f"`{_fmt_ms(pos)}` {self._progress_bar(pos, length)} `{_fmt_ms(length)}`", inline=False)
         rq = self._mention(guild, self._current_req.get(guild.id))
         emb.set_footer(text=f"Requested by {rq}.")
         q = list(self._queues.get(guild.id, deque()))
@@ -421,6 +792,8 @@ class Music(commands.Cog):
 
     @music_group.command(name="join")
     async def join_prefix(self, ctx: commands.Context):
+        if await self._reject_if_draining(ctx):
+            return
         ch = self._author_channel(ctx.author)
         if not ch:
             await ctx.send(
@@ -463,6 +836,8 @@ class Music(commands.Cog):
 
     @music_group.command(name="play")
     async def play_prefix(self, ctx: commands.Context, *, query: str):
+        if await self._reject_if_draining(ctx):
+            return
         player = self._get_player(ctx.guild)
         gid = ctx.guild.id
         self._last_text_channel[gid] = ctx.channel
@@ -491,12 +866,16 @@ class Music(commands.Cog):
                 )
                 return
 
+            # only requests that would reach Lavalink spend a token
+            if await self._reject_if_limited(ctx, "play", query, None if _is_spotify_url(query) else mafic.SearchType.YOUTUBE):
+                return
+
             gid = ctx.guild.id
             if not self._intro_played.get(gid, False):
                 try:
                     await self._play_intro_disnake(ch)
                 except Exception as e:
-                    print(f"[intro] local intro failed (music prefix): {e}")
+                    log.warning("Local intro failed (music prefix): %r", e)
                 finally:
                     self._intro_played[gid] = True
 
@@ -506,16 +885,18 @@ class Music(commands.Cog):
                     await ctx.guild.voice_client.disconnect(force=True)
                 except Exception:
                     pass
-                await asyncio.sleep(0.3)
+                await self.bot.timers.sleep(0.3)
 
             await self._connect(ctx.guild, ch)  # Lavalink connect (mafic)
             player = self._get_player(ctx.guild)
+        elif await self._reject_if_limited(ctx, "play", query, None if _is_spotify_url(query) else mafic.SearchType.YOUTUBE):
+            return
         try:
             is_spotify = _is_spotify_url(query)
             if is_spotify:
-                results = await player.fetch_tracks(query, search_type=None)
+                results = await self._fetch_tracks(player, query, search_type=None)
             else:
-                results = await player.fetch_tracks(query, search_type=mafic.SearchType.YOUTUBE)
+                results = await self._fetch_tracks(player, query, search_type=mafic.SearchType.YOUTUBE)
         except Exception as e:
             await ctx.send(
                 embed=disnake.Embed(
@@ -604,6 +985,7 @@ class Music(commands.Cog):
             return
         paused = getattr(player, "paused", False)
         await player.pause(not paused)
+        self.reaper.touch(player.guild.id)
         await ctx.send(
             embed=disnake.Embed(
                 title="Paused" if not paused else "Resumed",
@@ -627,7 +1009,7 @@ class Music(commands.Cog):
                 )
             )
             return
-        await ctx.send(embed=self._now_playing_embed(ctx.guild))
+        await ctx.send(embed=self._now_playing_embed(ctx.guild, progress=self._np_progress))
 
     @music_group.command(name="queue")
     async def queue_prefix(self, ctx: commands.Context, page: int = 1):
@@ -651,6 +1033,8 @@ class Music(commands.Cog):
         await player.stop()
         self._queues.get(ctx.guild.id, deque()).clear()
         self._stopped[ctx.guild.id] = True
+        self.reaper.touch(ctx.guild.id)
+        self._dirty.add(ctx.guild.id)
         await ctx.send(
             embed=disnake.Embed(
                 title="Stopped",
@@ -666,6 +1050,8 @@ class Music(commands.Cog):
 
     @music_slash.sub_command(name="join", description="Join your voice channel")
     async def join_slash(self, inter: disnake.ApplicationCommandInteraction):
+        if await self._reject_if_draining(inter):
+            return
         if not isinstance(inter.author, disnake.Member):
             await inter.response.send_message(
                 embed=disnake.Embed(
@@ -718,6 +1104,8 @@ class Music(commands.Cog):
 
     @music_slash.sub_command(name="play", description="Search YouTube and play / queue")
     async def play_slash(self, inter: disnake.ApplicationCommandInteraction, query: str):
+        if await self._reject_if_draining(inter):
+            return
         if not isinstance(inter.author, disnake.Member):
             await inter.response.send_message(
                 embed=disnake.Embed(
@@ -756,12 +1144,16 @@ class Music(commands.Cog):
                 )
                 return
 
+            # only requests that would reach Lavalink spend a token
+            if await self._reject_if_limited(inter, "play", query, None if _is_spotify_url(query) else mafic.SearchType.YOUTUBE):
+                return
+
             gid = inter.guild.id
             if not self._intro_played.get(gid, False):
                 try:
                     await self._play_intro_disnake(ch)
                 except Exception as e:
-                    print(f"[intro] local intro failed (music slash): {e}")
+                    log.warning("Local intro failed (music slash): %r", e)
                 finally:
                     self._intro_played[gid] = True
 
@@ -771,16 +1163,18 @@ class Music(commands.Cog):
                     await inter.guild.voice_client.disconnect(force=True)
                 except Exception:
                     pass
-                await asyncio.sleep(0.3)
+                await self.bot.timers.sleep(0.3)
 
             await self._connect(inter.guild, ch)  # Lavalink connect (mafic)
             player = self._get_player(inter.guild)
+        elif await self._reject_if_limited(inter, "play", query, None if _is_spotify_url(query) else mafic.SearchType.YOUTUBE):
+            return
         try:
             is_spotify = _is_spotify_url(query)
             if is_spotify:
-                results = await player.fetch_tracks(query, search_type=None)
+                results = await self._fetch_tracks(player, query, search_type=None)
             else:
-                results = await player.fetch_tracks(query, search_type=mafic.SearchType.YOUTUBE)
+                results = await self._fetch_tracks(player, query, search_type=mafic.SearchType.YOUTUBE)
         except Exception as e:
             await inter.response.send_message(
                 embed=disnake.Embed(
@@ -874,6 +1268,7 @@ class Music(commands.Cog):
             return
         paused = getattr(player, "paused", False)
         await player.pause(not paused)
+        self.reaper.touch(player.guild.id)
         await inter.response.send_message(
             embed=disnake.Embed(
                 title="Paused" if not paused else "Resumed",
@@ -898,7 +1293,7 @@ class Music(commands.Cog):
                 ephemeral=True,
             )
             return
-        await inter.response.send_message(embed=self._now_playing_embed(inter.guild))
+        await inter.response.send_message(embed=self._now_playing_embed(inter.guild, progress=self._np_progress))
 
     @music_slash.sub_command(name="queue", description="Show the queue (paged)")
     async def queue_slash(self, inter: disnake.ApplicationCommandInteraction, page: int = 1):
@@ -923,6 +1318,8 @@ class Music(commands.Cog):
         await player.stop()
         self._queues.get(inter.guild.id, deque()).clear()
         self._stopped[inter.guild.id] = True
+        self.reaper.touch(inter.guild.id)
+        self._dirty.add(inter.guild.id)
         await inter.response.send_message(
             embed=disnake.Embed(
                 title="Stopped",
@@ -937,6 +1334,9 @@ class Music(commands.Cog):
         guild_id = event.player.guild.id
         if self._stopped.get(guild_id):
             return
+        if getattr(event, "reason", None) in (mafic.EndReason.REPLACED, mafic.EndReason.CLEANUP):
+            # whoever replaced the track already started the next one
+            return
         await self._play_next_or_autoplay(event.player)
 
     @commands.Cog.listener()
@@ -954,17 +1354,55 @@ class Music(commands.Cog):
         before: disnake.VoiceState,
         after: disnake.VoiceState,
     ):
-        if not member.guild or member.bot:
+        if not member.guild:
             return
         gid = member.guild.id
         if gid not in self._vc_map:
             return
         tracked = self._vc_map[gid]
-        if (before and getattr(before.channel, "id", None) == tracked) or (
-            after and getattr(after.channel, "id", None) == tracked
-        ):
+        before_id = getattr(getattr(before, "channel", None), "id", None)
+        after_id = getattr(getattr(after, "channel", None), "id", None)
+        if before_id == after_id:
+            # mute / deafen / stream changes
+            return
+        if self.bot.user and member.id == self.bot.user.id:
+            if after_id and after_id != tracked:
+                # we were moved, start counting the new channel
+                self._vc_map[gid] = after_id
+                self._seed_humans(member.guild, after.channel)
+                await self._check_empty_and_leave(member.guild)
+            return
+        humans = self._humans.setdefault(gid, set())
+        if after_id == tracked:
+            if not member.bot:
+                humans.add(member.id)
+        elif before_id == tracked:
+            # by id, so a bot the seed counted while it was uncached is removed too
+            humans.discard(member.id)
             await self._check_empty_and_leave(member.guild)
 
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: disnake.Guild):
+        if guild.id in self._players:
+            await self._disconnect(guild)
+        else:
+            self._forget_guild(guild.id)
+
+    @music_group.command(name="reaper")
+    @commands.is_owner()
+    async def reaper_prefix(self, ctx: commands.Context):
+        await ctx.send(
+            embed=disnake.Embed(
+                title="Idle Reaper",
+                description=(
+                    f"Active players: **{len(self._players)}**\n"
+                    f"Reclaimed players: **{self.reaper.reclaimed}**\n"
+                    f"Idle timeout: `{self.reaper.idle_timeout}s` · Paused timeout: `{self.reaper.paused_timeout}s`"
+                ),
+                color=self.color,
+            )
+        )
+
     @commands.group(name="radio", invoke_without_command=True)
     async def radio_group(self, ctx: commands.Context):
         stations = "\n".join([f"`{key}` - {info['name']}" for key, info in RADIO_STATIONS.items()])
@@ -978,6 +1416,8 @@ class Music(commands.Cog):
 
     @radio_group.command(name="play")
     async def radio_play_prefix(self, ctx: commands.Context, *, station: str = None):
+        if await self._reject_if_draining(ctx):
+            return
         if not station:
             stations = "\n".join([f"`{key}` - {info['name']}" for key, info in RADIO_STATIONS.items()])
             await ctx.send(
@@ -1026,12 +1466,16 @@ class Music(commands.Cog):
                 )
                 return
 
+            # only requests that would reach Lavalink spend a token
+            if await self._reject_if_limited(ctx, "radio", RADIO_STATIONS[station_key]["url"]):
+                return
+
             gid = ctx.guild.id
             if not self._intro_played.get(gid, False):
                 try:
                     await self._play_intro_disnake(ch)
                 except Exception as e:
-                    print(f"[intro] local intro failed: {e}")
+                    log.warning("Local intro failed: %r", e)
                 finally:
                     self._intro_played[gid] = True
 
@@ -1041,32 +1485,37 @@ class Music(commands.Cog):
                     await ctx.guild.voice_client.disconnect(force=True)
                 except Exception:
                     pass
-                await asyncio.sleep(0.3)
+                await self.bot.timers.sleep(0.3)
 
             await self._connect(ctx.guild, ch)
             player = self._get_player(ctx.guild)
+        elif await self._reject_if_limited(ctx, "radio", RADIO_STATIONS[station_key]["url"]):
+            return
         
         station_info = RADIO_STATIONS[station_key]
         try:
-            results = await player.fetch_tracks(station_info["url"])
+            results = await self._fetch_tracks(player, station_info["url"])
             if isinstance(results, list) and results:
                 track = results[0]
                 gid = ctx.guild.id
 
                 await player.set_volume(0)
                 await player.play(track, start_time=0)
+                self.reaper.touch(gid)
                 self._current[gid] = track
                 self._current_req[gid] = getattr(ctx.author, "id", None)
+                self._dirty.add(gid)
                 self._last[gid] = track
 
                 try:
-                    await asyncio.sleep(5)
+                    await self.bot.timers.sleep(5)
                 except asyncio.CancelledError:
                     return
 
-                for vol in (20, 40, 60, 80, 100):
-                    await player.set_volume(vol)
-                    await asyncio.sleep(0.12)
+                with span("radio fade"):
+                    for vol in (20, 40, 60, 80, 100):
+                        await player.set_volume(vol)
+                        await self.bot.timers.sleep(0.12)
 
                 await ctx.send(
                     embed=disnake.Embed(
@@ -1098,6 +1547,8 @@ class Music(commands.Cog):
 
     @radio_slash.sub_command(name="play", description="Play a radio station")
     async def radio_play_slash(self, inter: disnake.ApplicationCommandInteraction, station: str = None):
+        if await self._reject_if_draining(inter):
+            return
         if not isinstance(inter.author, disnake.Member):
             await inter.response.send_message(
                 embed=disnake.Embed(
@@ -1157,13 +1608,17 @@ class Music(commands.Cog):
                     ephemeral=True,
                 )
                 return
+
+            # only requests that would reach Lavalink spend a token
+            if await self._reject_if_limited(inter, "radio", RADIO_STATIONS[station_key]["url"]):
+                return
             
             gid = inter.guild.id
             if not self._intro_played.get(gid, False):
                 try:
                     await self._play_intro_disnake(ch)
                 except Exception as e:
-                    print(f"[intro] local intro failed (slash): {e}")
+                    log.warning("Local intro failed (slash): %r", e)
                 finally:
                     self._intro_played[gid] = True
 
@@ -1173,32 +1628,37 @@ class Music(commands.Cog):
                     await inter.guild.voice_client.disconnect(force=True)
                 except Exception:
                     pass
-                await asyncio.sleep(0.3)
+                await self.bot.timers.sleep(0.3)
 
             await self._connect(inter.guild, ch)
             player = self._get_player(inter.guild)
+        elif await self._reject_if_limited(inter, "radio", RADIO_STATIONS[station_key]["url"]):
+            return
         
         station_info = RADIO_STATIONS[station_key]
         try:
-            results = await player.fetch_tracks(station_info["url"])
+            results = await self._fetch_tracks(player, station_info["url"])
             if isinstance(results, list) and results:
                 track = results[0]
                 gid = inter.guild.id
 
                 await player.set_volume(0)
                 await player.play(track, start_time=0)
+                self.reaper.touch(gid)
                 self._current[gid] = track
                 self._current_req[gid] = getattr(inter.author, "id", None)
+                self._dirty.add(gid)
                 self._last[gid] = track
 
                 try:
-                    await asyncio.sleep(5)
+                    await self.bot.timers.sleep(5)
                 except asyncio.CancelledError:
                     return
 
-                for vol in (20, 40, 60, 80, 100):
-                    await player.set_volume(vol)
-                    await asyncio.sleep(0.12)
+                with span("radio fade"):
+                    for vol in (20, 40, 60, 80, 100):
+                        await player.set_volume(vol)
+                        await self.bot.timers.sleep(0.12)
 
                 await inter.response.send_message(
                     embed=disnake.Embed(
@@ -1226,16 +1686,6 @@ class Music(commands.Cog):
                 ephemeral=True,
             )
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        if not self._synced:
-            try:
-                await self.bot.sync_commands()
-            except Exception as e:
-                print(f"Failed to sync commands: {e}")
-            else:
-                self._synced = True
-
 
 def setup(bot):
     bot.add_cog(Music(bot))
@@ -0,0 +1,85 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable
+
+from timers import TimerWheel
+
+log = logging.getLogger("DopplerDeck.music")
+
+# Discord allows roughly 5 message edits per 5 s in a channel
+CHANNEL_EDIT_INTERVAL = 1.0
+# and we keep the bot-wide edit rate well under the global REST limit
+GLOBAL_EDITS_PER_SECOND = 20
+
+EditFactory = Callable[[], Awaitable[None]]
+
+
+class EditScheduler:
+    """Throttles message edits per channel and bot-wide.
+
+    Edits are keyed (one key per now-playing message); a newer edit for a key
+    replaces the queued one, so a burst of track changes collapses into a
+    single edit that renders the latest state when it finally runs.
+    """
+
+    def __init__(self, timers: TimerWheel, channel_interval: float = CHANNEL_EDIT_INTERVAL, global_rate: int = GLOBAL_EDITS_PER_SECOND):
+        self.timers = timers
+        self.channel_interval = channel_interval
+        self.global_rate = global_rate
+        self.sent = 0
+        self.coalesced = 0
+        self._pending: Dict[int, "OrderedDict[Hashable, EditFactory]"] = {}
+        self._next_at: Dict[int, float] = {}
+        self._scheduled: set = set()
+        self._recent: Deque[float] = deque()
+
+    def submit(self, channel_id: int, key: Hashable, factory: EditFactory):
+        pending = self._pending.setdefault(channel_id, OrderedDict())
+        if key in pending:
+            self.coalesced += 1
+        pending[key] = factory
+        self._schedule(channel_id)
+
+    def forget(self, key: Hashable):
+        for channel_id, pending in list(self._pending.items()):
+            pending.pop(key, None)
+            if not pending:
+                self._pending.pop(channel_id, None)
+
+    def _schedule(self, channel_id: int, delay: float = 0.0):
+        if channel_id in self._scheduled:
+            return
+        self._scheduled.add(channel_id)
+        wait = max(delay, self._next_at.get(channel_id, 0.0) - time.monotonic())
+        self.timers.call_later(wait, self._flush, channel_id)
+
+    def _global_wait(self, now: float) -> float:
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+        if len(self._recent) < self.global_rate:
+            return 0.0
+        return 1.0 - (now - self._recent[0])
+
+    async def _flush(self, channel_id: int):
+        self._scheduled.discard(channel_id)
+        pending = self._pending.get(channel_id)
+        if not pending:
+            self._pending.pop(channel_id, None)
+            self._next_at.pop(channel_id, None)
+            return
+        now = time.monotonic()
+        wait = self._global_wait(now)
+        if wait > 0:
+            self._schedule(channel_id, wait)
+            return
+        _, factory = pending.popitem(last=False)
+        self._recent.append(now)
+        self._next_at[channel_id] = now + self.channel_interval
+        # runs again once the channel cools down: sends what queued up meanwhile or drops the channel's state
+        self._schedule(channel_id)
+        try:
+            await factory()
+            self.sent += 1
+        except Exception as e:
+            log.warning("Scheduled message edit failed: %r", e)
@@ -0,0 +1,44 @@
+import time
+from typing import Dict, Iterable, List, Tuple
+
+
+class IdleReaper:
+    """Tracks the last activity per guild and picks sessions to reclaim.
+
+    A session is reclaimable when nothing has played for ``idle_timeout``
+    seconds, or when it has sat paused for ``paused_timeout`` seconds.
+    """
+
+    def __init__(self, idle_timeout: float, paused_timeout: float):
+        self.idle_timeout = idle_timeout
+        self.paused_timeout = paused_timeout
+        self.reclaimed = 0
+        self._last_activity: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._last_activity)
+
+    def touch(self, guild_id: int):
+        self._last_activity[guild_id] = time.monotonic()
+
+    def forget(self, guild_id: int):
+        self._last_activity.pop(guild_id, None)
+
+    def idle_for(self, guild_id: int) -> float:
+        last = self._last_activity.get(guild_id)
+        return 0.0 if last is None else time.monotonic() - last
+
+    def expired(self, sessions: Iterable[Tuple[int, bool, bool]]) -> List[int]:
+        """Guild ids to reclaim, from ``(guild_id, playing, paused)`` tuples"""
+        now = time.monotonic()
+        out = []
+        for guild_id, playing, paused in sessions:
+            if playing and not paused:
+                # the idle clock starts when playback stops, not when the track started
+                self._last_activity[guild_id] = now
+                continue
+            last = self._last_activity.setdefault(guild_id, now)
+            limit = self.paused_timeout if paused else self.idle_timeout
+            if limit > 0 and now - last >= limit:
+                out.append(guild_id)
+        return out
@@ -0,0 +1,85 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+
+class SessionSnapshot(NamedTuple):
+    guild_id: int
+    voice_channel_id: int
+    text_channel_id: Optional[int]
+    current: Optional[str]  # Lavalink encoded track
+    current_requester_id: Optional[int]
+    position: int
+    queue: List[Tuple[str, Optional[int]]]  # (encoded track, requester id)
+
+
+class SessionStore:
+    """Per-guild playback sessions in a local SQLite file.
+
+    Writes come in batches from a worker thread: full rows for guilds whose
+    queue or track changed, and position-only updates for the rest.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                guild_id INTEGER PRIMARY KEY,
+                voice_channel_id INTEGER NOT NULL,
+                text_channel_id INTEGER,
+                current TEXT,
+                current_requester_id INTEGER,
+                position INTEGER NOT NULL DEFAULT 0,
+                queue TEXT NOT NULL DEFAULT '[]',
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def write(self, upserts: Iterable[SessionSnapshot], positions: Iterable[Tuple[int, int]], deletes: Iterable[int]):
+        now = time.time()
+        rows = [
+            (s.guild_id, s.voice_channel_id, s.text_channel_id, s.current, s.current_requester_id, s.position, json.dumps(s.queue), now)
+            for s in upserts
+        ]
+        with self._lock, self._conn:
+            if rows:
+                self._conn.executemany("""
+                    INSERT INTO sessions (guild_id, voice_channel_id, text_channel_id, current, current_requester_id, position, queue, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(guild_id) DO UPDATE SET
+                        voice_channel_id = excluded.voice_channel_id,
+                        text_channel_id = excluded.text_channel_id,
+                        current = excluded.current,
+                        current_requester_id = excluded.current_requester_id,
+                        position = excluded.position,
+                        queue = excluded.queue,
+                        updated_at = excluded.updated_at
+                """, rows)
+            self._conn.executemany(
+                "UPDATE sessions SET position = ?, updated_at = ? WHERE guild_id = ?",
+                [(pos, now, gid) for gid, pos in positions],
+            )
+            self._conn.executemany("DELETE FROM sessions WHERE guild_id = ?", [(gid,) for gid in deletes])
+
+    def load(self, max_age: Optional[float] = None) -> List[SessionSnapshot]:
+        query = "SELECT guild_id, voice_channel_id, text_channel_id, current, current_requester_id, position, queue FROM sessions"
+        params: tuple = ()
+        if max_age is not None:
+            query += " WHERE updated_at >= ?"
+            params = (time.time() - max_age,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            SessionSnapshot(gid, vc, tc, cur, req, pos or 0, [(t, r) for t, r in json.loads(queue or "[]")])
+            for gid, vc, tc, cur, req, pos, queue in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,104 @@
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import COMMAND_RATE_LIMITED
+
+PRUNE_INTERVAL = 60.0
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by id: ``burst`` tokens each, refilled at ``per_minute`` a minute"""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60
+        self.burst = max(1, burst)
+        self._buckets: Dict[int, list] = {}  # key -> [tokens, updated]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def retry_after(self, key: int, now: float) -> float:
+        """0 when ``key`` has a token, else seconds until it has one"""
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key: int, now: float):
+        self._buckets[key] = [self._tokens(key, now) - 1, now]
+
+    def prune(self, now: float):
+        # a bucket that has refilled is the same as no bucket at all
+        full = [key for key, (tokens, updated) in self._buckets.items() if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+    def _tokens(self, key: int, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        return min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+
+
+class RateLimits:
+    """Per-user and per-guild limits on the commands that cost a Lavalink or top.gg lookup.
+
+    Unconfigured, nothing is limited. Callers decide what counts: a search
+    answered from the cache should never reach ``check``.
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, Dict[str, TokenBucketLimiter]] = {}
+        self._pruned = time.monotonic()
+
+    def configure(self, limits: Dict[str, Dict[str, Tuple[float, int]]]):
+        """``{command: {scope: (per minute, burst)}}``; buckets of unchanged limits are kept"""
+        configured: Dict[str, Dict[str, TokenBucketLimiter]] = {}
+        for command, scopes in limits.items():
+            for scope, (per_minute, burst) in scopes.items():
+                if per_minute <= 0:
+                    continue
+                old = self._limiters.get(command, {}).get(scope)
+                if old is None or old.per_minute != per_minute or old.burst != max(1, burst):
+                    old = TokenBucketLimiter(per_minute, burst)
+                configured.setdefault(command, {})[scope] = old
+        self._limiters = configured
+
+    def check(self, command: str, user_id: Optional[int], guild_id: Optional[int]) -> Optional[Tuple[str, float]]:
+        """Take a token from the user's and the guild's bucket, or from neither and
+        return ``(scope, seconds to wait)`` for the first one that is empty"""
+        limiters = self._limiters.get(command)
+        if not limiters:
+            return None
+        now = time.monotonic()
+        if now - self._pruned >= PRUNE_INTERVAL:
+            self._pruned = now
+            for scopes in self._limiters.values():
+                for limiter in scopes.values():
+                    limiter.prune(now)
+        keys = {"user": user_id, "guild": guild_id}
+        active = [(scope, limiter, keys.get(scope)) for scope, limiter in limiters.items() if keys.get(scope) is not None]
+        for scope, limiter, key in active:
+            wait = limiter.retry_after(key, now)
+            if wait > 0:
+                COMMAND_RATE_LIMITED.inc(command=command, scope=scope)
+                return scope, wait
+        for _, limiter, key in active:
+            limiter.take(key, now)
+        return None
+
+
+def denial_message(command: str, scope: str, retry_after: float) -> str:
+    who = "This server is" if scope == "guild" else "You're"
+    return f"{who} using `{command}` too often, try again in {max(1, math.ceil(retry_after))}s."
+
+
+_limits: Optional[RateLimits] = None
+
+
+def get_limits() -> RateLimits:
+    """The process-wide RateLimits"""
+    global _limits
+    if _limits is None:
+        _limits = RateLimits()
+    return _limits
@@ -0,0 +1,304 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+log = logging.getLogger("DopplerDeck.recorder")
+
+FORMAT_VERSION = 1
+FLUSH_INTERVAL = 2
+# what the music and utils cogs react to; guild creates/deletes keep the replayed cache in shape
+GATEWAY_EVENTS = ("MESSAGE_CREATE", "INTERACTION_CREATE", "VOICE_STATE_UPDATE", "GUILD_CREATE", "GUILD_DELETE")
+RECORDED_BOT_ID = "1"
+# every fake snowflake dates from 2024-01-01, a real creation time is close to unique per account
+FAKE_SNOWFLAKE_BASE = (1704067200000 - 1420070400000) << 22
+
+ID_KEYS = frozenset((
+    "id", "guild_id", "channel_id", "user_id", "owner_id", "parent_id", "message_id", "application_id",
+    "webhook_id", "target_id", "last_message_id", "guildId",
+))
+ID_LIST_KEYS = frozenset(("roles", "mention_roles"))
+SECRET_KEYS = frozenset((
+    "token", "session_id", "sessionId", "endpoint", "email", "avatar", "banner", "icon", "splash",
+    "discovery_splash", "avatar_decoration_data", "collectibles", "clan", "primary_guild", "topic", "description",
+))
+USER_NAME_KEYS = frozenset(("username", "global_name", "nick"))
+DROPPED_MESSAGE_KEYS = ("embeds", "attachments", "components", "sticker_items", "poll", "referenced_message", "interaction_metadata", "message_snapshots")
+
+
+class Scrubber:
+    """Strips names, message text, tokens and track metadata out of recorded payloads.
+
+    Snowflakes are swapped for sequential fake ones and names and free text for
+    salted hashes, so the same user, channel or search query still lines up
+    across a recording (search cache hits replay as hits) but nothing maps back
+    to the original.
+    """
+
+    def __init__(self, bot_id: Optional[int], prefix: str, command_words: frozenset):
+        self.prefix = prefix
+        self.command_words = command_words
+        self._salt = os.urandom(16)
+        self._ids: Dict[str, str] = {str(bot_id): RECORDED_BOT_ID} if bot_id else {}
+
+    def hash(self, value: str, size: int = 10) -> str:
+        return hashlib.blake2b(value.encode(), key=self._salt, digest_size=16).hexdigest()[:size]
+
+    def snowflake(self, value):
+        if not isinstance(value, str) or not value.isdigit():
+            return value
+        fake = self._ids.get(value)
+        if fake is None:
+            fake = self._ids[value] = str(FAKE_SNOWFLAKE_BASE + len(self._ids) + 1)
+        return fake
+
+    def walk(self, data, names: bool = True):
+        """Scrub a payload; ``names=False`` keeps ``name`` keys, for command and option names"""
+        if isinstance(data, list):
+            return [self.walk(v, names) for v in data]
+        if not isinstance(data, dict):
+            return data
+        out = {}
+        for key, value in data.items():
+            if key in ID_KEYS:
+                out[key] = self.snowflake(value)
+            elif key in ID_LIST_KEYS and isinstance(value, list) and all(isinstance(v, str) for v in value):
+                out[key] = [self.snowflake(v) for v in value]
+            elif key in SECRET_KEYS:
+                out[key] = "redacted" if isinstance(value, str) else None
+            elif (key in USER_NAME_KEYS or (names and key == "name")) and isinstance(value, str):
+                out[key] = f"{key}-{self.hash(value, 6)}"
+            else:
+                out[key] = self.walk(value, names)
+        return out
+
+    def query(self, text: str) -> str:
+        """A search or link argument: links keep their host, path shape and query keys"""
+        url = urlparse(text)
+        if url.scheme in ("http", "https") and url.netloc:
+            segments = url.path.split("/")
+            path = "/".join(seg if i < 2 else self.hash(seg) for i, seg in enumerate(segments))
+            # playlist ids keep their two letter kind (PL, RD, ...) since it changes what loads
+            params = [(k, (v[:2] if k == "list" else "") + self.hash(v)) for k, v in parse_qsl(url.query)]
+            return f"{url.scheme}://{url.netloc}{path}" + (f"?{urlencode(params)}" if params else "")
+        return "q" + self.hash(text)
+
+    def content(self, content: str) -> str:
+        if not content.startswith(self.prefix):
+            return "x" * len(content)
+        words = content[len(self.prefix):].split()
+        kept = []
+        while words and words[0].lower() in self.command_words:
+            kept.append(words.pop(0))
+        args = " ".join(words)
+        return self.prefix + " ".join(kept + ([self.query(args)] if args else []))
+
+    def gateway(self, name: str, data: dict) -> dict:
+        command = data.pop("data", None) if name == "INTERACTION_CREATE" else None
+        data = self.walk(data)
+        if name == "MESSAGE_CREATE":
+            data["content"] = self.content(data.get("content") or "")
+            for key in DROPPED_MESSAGE_KEYS:
+                if key in data:
+                    data[key] = None if key == "referenced_message" else []
+        elif name == "INTERACTION_CREATE" and command is not None:
+            data["data"] = self._command(command)
+        elif name == "GUILD_CREATE":
+            data.pop("presences", None)
+        return data
+
+    def _command(self, command: dict) -> dict:
+        # command and option names pick the handler, they stay; what they resolved to does not
+        resolved = command.pop("resolved", None)
+        command = self.walk(command, names=False)
+        self._options(command.get("options") or [])
+        if isinstance(resolved, dict):
+            command["resolved"] = {
+                kind: {self.snowflake(key): self.walk(value) for key, value in items.items()} if isinstance(items, dict) else self.walk(items)
+                for kind, items in resolved.items()
+            }
+        return command
+
+    def _options(self, options: list):
+        for opt in options:
+            if isinstance(opt.get("value"), str):
+                opt["value"] = self.query(opt["value"])
+            self._options(opt.get("options") or [])
+
+    def lavalink(self, data: dict) -> dict:
+        data = self.walk(data)
+        track = data.get("track")
+        if isinstance(track, dict):
+            info = track.get("info") or {}
+            ident = self.hash(info.get("identifier") or "", 11)
+            track["encoded"] = "QAAA" + ident + "x" * max(0, len(track.get("encoded") or "") - 15)
+            info.update(
+                identifier=ident,
+                title=f"track-{self.hash(info.get('title') or '', 8)}",
+                author=f"artist-{self.hash(info.get('author') or '', 6)}",
+                uri=self.query(info["uri"]) if info.get("uri") else None,
+                artworkUrl=None,
+                isrc=None,
+            )
+            track["pluginInfo"] = {}
+            track["userData"] = {}
+        return data
+
+
+class EventRecorder:
+    """Records what the bot receives, sanitized, to a gzipped JSON lines file.
+
+    Gateway dispatches are captured at the connection state's parsers and
+    Lavalink messages at mafic's node class, so the replay sees the same payloads
+    in the same order. Events are copied as JSON when they arrive; scrubbing
+    and compression happen in a worker thread every few seconds.
+    """
+
+    def __init__(self, bot, path: str, *, prefix: str = ">"):
+        self.bot = bot
+        self.path = path
+        self.prefix = prefix
+        self.events = 0
+        self.started_at: Optional[float] = None
+        self._t0 = 0.0
+        self._pending: List[Tuple[float, str, str, str]] = []
+        self._parsers: Dict[str, Callable] = {}
+        self._handle_msg: Optional[Callable] = None
+        self._timer = None
+        self._scrubber: Optional[Scrubber] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def recording(self) -> bool:
+        return self.started_at is not None
+
+    def start(self):
+        if self.recording:
+            return
+        words = set()
+        for cmd in self.bot.walk_commands():
+            words.add(cmd.name.lower())
+            words.update(a.lower() for a in cmd.aliases)
+        self._scrubber = Scrubber(getattr(self.bot.user, "id", None), self.prefix, frozenset(words))
+        self.started_at = time.time()
+        self._t0 = time.monotonic()
+        header = {"format": FORMAT_VERSION, "started_at": int(self.started_at), "bot_id": RECORDED_BOT_ID, "prefix": self.prefix}
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+        # the replay starts from the guilds as they are now
+        for guild in list(self.bot.guilds):
+            self._pending.append((0.0, "g", "GUILD_CREATE", json.dumps(_guild_snapshot(guild, self.bot.user))))
+        parsers = self.bot._connection.parsers
+        for name in GATEWAY_EVENTS:
+            original = parsers.get(name)
+            if original is not None:
+                self._parsers[name] = original
+                parsers[name] = self._wrap_parser(name, original)
+        self._hook_lavalink()
+        self._timer = self.bot.timers.call_every(FLUSH_INTERVAL, self.flush)
+        log.info("Recording gateway and Lavalink events to %s", self.path)
+
+    async def stop(self):
+        if not self.recording:
+            return
+        parsers = self.bot._connection.parsers
+        for name, original in self._parsers.items():
+            parsers[name] = original
+        self._parsers.clear()
+        if self._handle_msg is not None:
+            from mafic import Node
+            Node._handle_msg = self._handle_msg
+            self._handle_msg = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        log.info("Recorded %d events in %.0fs to %s", self.events, time.time() - self.started_at, self.path)
+        self.started_at = None
+
+    def _wrap_parser(self, name: str, original: Callable) -> Callable:
+        bot_id = str(getattr(self.bot.user, "id", ""))
+
+        def parser(data):
+            # the bot's own voice state is Discord answering a join; the replay's gateway answers those itself
+            if not (name == "VOICE_STATE_UPDATE" and data.get("user_id") == bot_id):
+                self._pending.append((time.monotonic() - self._t0, "g", name, json.dumps(data)))
+            return original(data)
+        return parser
+
+    def _hook_lavalink(self):
+        try:
+            from mafic import Node
+        except ImportError:
+            return
+        # nodes use __slots__, so the hook goes on the class and covers nodes that connect later too
+        original = self._handle_msg = Node._handle_msg
+        recorder = self
+
+        async def handle(node, data):
+            recorder._pending.append((time.monotonic() - recorder._t0, "l", data.get("op", ""), json.dumps(data)))
+            return await original(node, data)
+        Node._handle_msg = handle
+
+    async def flush(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        async with self._lock:
+            await asyncio.to_thread(self._write, batch)
+        self.events += len(batch)
+
+    def _write(self, batch: List[Tuple[float, str, str, str]]):
+        scrub = self._scrubber
+        lines = []
+        for at, kind, name, raw in batch:
+            data = json.loads(raw)
+            data = scrub.gateway(name, data) if kind == "g" else scrub.lavalink(data)
+            lines.append(json.dumps([round(at, 4), kind, name, data], separators=(",", ":")))
+        # every flush is its own gzip member, which gzip readers treat as one stream
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def _guild_snapshot(guild, me) -> dict:
+    """GUILD_CREATE-shaped payload of a cached guild: channels, roles, and who is in voice"""
+    voice_states = []
+    members = [_member_snapshot(guild.me)] if guild.me is not None else []
+    # read the voice states directly, the member cache may be off in lean gateway profiles
+    for user_id, vs in guild._voice_states.items():
+        if vs.channel is None or user_id == getattr(me, "id", None):
+            continue
+        member = guild.get_member(user_id)
+        if member is not None:
+            members.append(_member_snapshot(member))
+        voice_states.append({
+            "user_id": str(user_id), "channel_id": str(vs.channel.id), "session_id": "", "deaf": False, "mute": False,
+            "self_deaf": vs.self_deaf, "self_mute": vs.self_mute, "self_video": False, "suppress": False, "request_to_speak_timestamp": None,
+        })
+    return {
+        "id": str(guild.id),
+        "name": guild.name,
+        "owner_id": str(guild.owner_id),
+        "member_count": guild.member_count or len(members),
+        "large": bool(guild.large),
+        "features": [],
+        "emojis": [],
+        "stickers": [],
+        "threads": [],
+        "roles": [{"id": str(r.id), "name": r.name, "color": 0, "colors": {"primary_color": 0, "secondary_color": None, "tertiary_color": None}, "hoist": False, "position": r.position, "permissions": str(r.permissions.value), "managed": False, "mentionable": False} for r in guild.roles],
+        "channels": [{"id": str(c.id), "type": c.type.value, "name": c.name, "position": c.position, "permission_overwrites": [], **({"parent_id": str(c.category_id)} if c.category_id else {})} for c in guild.channels],
+        "members": members,
+        "voice_states": voice_states,
+    }
+
+
+def _member_snapshot(member) -> dict:
+    return {
+        "user": {"id": str(member.id), "username": member.name, "discriminator": "0", "global_name": None, "avatar": None, "bot": member.bot},
+        "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0,
+    }
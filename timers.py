@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+import math
+from typing import Any, Callable, List, Optional, Set
+
+log = logging.getLogger("DopplerDeck.timers")
+
+TICK = 0.05
+SLOTS = 512  # one revolution is TICK * SLOTS = 25.6 s
+
+
+class Timer:
+    """Handle for a callback scheduled on a TimerWheel"""
+
+    __slots__ = ("when", "interval", "callback", "args", "cancelled", "_wheel", "_task")
+
+    def __init__(self, wheel: "TimerWheel", when: int, interval: Optional[float], callback: Callable, args: tuple):
+        self.when = when
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._wheel = wheel
+        self._task: Optional[asyncio.Task] = None
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self._wheel._remove(self)
+
+
+class TimerWheel:
+    """One hashed timer wheel shared by every periodic and delayed job.
+
+    Timers hash into ``SLOTS`` buckets by their deadline tick, so scheduling
+    and cancelling are O(1) and thousands of per-guild timers cost a single
+    loop callback instead of one asyncio task each. The wheel only wakes for
+    slots that hold something, and coroutine callbacks run as tasks so a slow
+    job never delays the rest of the slot.
+    """
+
+    def __init__(self, tick: float = TICK, slots: int = SLOTS):
+        self.tick = tick
+        self._slots: List[Set[Timer]] = [set() for _ in range(slots)]
+        self._count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._origin = 0.0
+        self._cursor = 0  # last tick processed
+        self._armed: Optional[int] = None
+        self._advancing = False
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def call_later(self, delay: float, callback: Callable, *args: Any) -> Timer:
+        """Run ``callback(*args)`` once after ``delay`` seconds"""
+        return self._schedule(delay, None, callback, args)
+
+    def call_every(self, interval: float, callback: Callable, *args: Any, delay: Optional[float] = None) -> Timer:
+        """Run ``callback(*args)`` every ``interval`` seconds, first after ``delay`` (default ``interval``)"""
+        return self._schedule(interval if delay is None else delay, interval, callback, args)
+
+    async def sleep(self, delay: float):
+        """asyncio.sleep on the wheel, at tick resolution"""
+        fut = self._ensure_loop().create_future()
+        timer = self.call_later(delay, _wake, fut)
+        try:
+            await fut
+        finally:
+            timer.cancel()
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for slot in self._slots:
+            for timer in slot:
+                timer.cancelled = True
+            slot.clear()
+        self._count = 0
+        self._armed = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._origin = self._loop.time()
+        return self._loop
+
+    def _now_tick(self) -> int:
+        return int((self._loop.time() - self._origin) / self.tick)
+
+    def _schedule(self, delay: float, interval: Optional[float], callback: Callable, args: tuple) -> Timer:
+        self._ensure_loop()
+        when = max(self._cursor, self._now_tick()) + max(1, math.ceil(delay / self.tick))
+        timer = Timer(self, when, interval, callback, args)
+        self._insert(timer)
+        return timer
+
+    def _insert(self, timer: Timer):
+        self._slots[timer.when % len(self._slots)].add(timer)
+        self._count += 1
+        # while a slot is being processed _advance re-arms once at the end
+        if not self._advancing and (self._armed is None or timer.when < self._armed):
+            self._arm(timer.when)
+
+    def _remove(self, timer: Timer):
+        slot = self._slots[timer.when % len(self._slots)]
+        if timer in slot:
+            slot.discard(timer)
+            self._count -= 1
+
+    def _arm(self, tick: int):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed = tick
+        # a fresh context, so jobs don't inherit whatever (e.g. a trace) was current when the wheel was armed
+        self._handle = self._loop.call_at(self._origin + tick * self.tick, self._advance, context=contextvars.Context())
+
+    def _advance(self):
+        self._handle, self._armed = None, None
+        now = self._now_tick()
+        nslots = len(self._slots)
+        # after a long stall every slot is visited once rather than once per missed tick
+        start = max(self._cursor + 1, now - nslots + 1)
+        due: List[Timer] = []
+        for t in range(start, now + 1):
+            slot = self._slots[t % nslots]
+            if slot:
+                ready = [timer for timer in slot if timer.when <= now]
+                for timer in ready:
+                    slot.discard(timer)
+                due.extend(ready)
+        self._count -= len(due)
+        self._cursor = now
+        self._advancing = True
+        try:
+            for timer in sorted(due, key=lambda x: x.when):
+                self._fire(timer)
+        finally:
+            self._advancing = False
+        self._arm_next()
+
+    def _arm_next(self):
+        if self._count <= 0 or self._armed is not None:
+            return
+        nslots = len(self._slots)
+        for offset in range(1, nslots + 1):
+            if self._slots[(self._cursor + offset) % nslots]:
+                # may hold timers a revolution or more away; waking just moves the cursor on
+                self._arm(self._cursor + offset)
+                return
+
+    def _fire(self, timer: Timer):
+        if timer.cancelled:
+            return
+        if timer.interval is not None:
+            timer.when = self._cursor + max(1, math.ceil(timer.interval / self.tick))
+            self._insert(timer)
+            # a periodic job that is still running skips this beat instead of overlapping
+            if timer._task is not None and not timer._task.done():
+                return
+        try:
+            result = timer.callback(*timer.args)
+        except Exception:
+            log.exception("Timer callback %r failed", timer.callback)
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            timer._task = task
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Timer task failed", exc_info=task.exception())
+
+
+def _wake(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
@@ -2,10 +2,26 @@ import disnake
 from disnake.ext import commands
 import aiohttp
 import asyncio
+import logging
 import os
+import time
 from typing import Optional
 
+from config import get_config
+from ratelimit import denial_message, get_limits
+from timers import Timer
+from topgg.webhook import API_VOTE_TTL, VoteCache, VoteWebhook
+
+log = logging.getLogger("DopplerDeck.topgg")
+
 TOPGG_TOKEN = os.getenv("TOPGG_TOKEN")
+TOPGG_WEBHOOK_AUTH = os.getenv("TOPGG_WEBHOOK_AUTH")
+TOPGG_WEBHOOK_HOST = os.getenv("TOPGG_WEBHOOK_HOST", "0.0.0.0")
+TOPGG_WEBHOOK_PORT = int(os.getenv("TOPGG_WEBHOOK_PORT", "5000"))
+TOPGG_WEBHOOK_PATH = os.getenv("TOPGG_WEBHOOK_PATH", "/dblwebhook")
+
+# minimum seconds between two stats POSTs; guild churn inside a window is coalesced
+STATS_POST_WINDOW = 60
 
 
 class TopGG(commands.Cog):
@@ -16,59 +32,170 @@ class TopGG(commands.Cog):
         self.token = TOPGG_TOKEN
         self.headers = {"Authorization": self.token} if self.token else None
         self.topgg_api = "https://top.gg/api"
+        self.color = get_config().embed_color
         self.update_stats_task = None
+        self._post_lock = asyncio.Lock()
+        self._post_handle: Optional[Timer] = None
+        self._last_post_at = float("-inf")
+        self._last_posted: Optional[dict] = None
+        self.vote_cache = VoteCache()
+        self.webhook = None
+        if TOPGG_WEBHOOK_AUTH:
+            self.webhook = VoteWebhook(
+                self.vote_cache,
+                auth=TOPGG_WEBHOOK_AUTH,
+                host=TOPGG_WEBHOOK_HOST,
+                port=TOPGG_WEBHOOK_PORT,
+                path=TOPGG_WEBHOOK_PATH,
+                on_vote=self._on_webhook_vote,
+            )
 
     def cog_unload(self):
-        """Cancel the stats updating task when the cog is unloaded"""
+        """Cancel the stats updating task and stop the webhook when the cog is unloaded"""
         if self.update_stats_task:
             self.update_stats_task.cancel()
+        if self._post_handle:
+            self._post_handle.cancel()
+            self._post_handle = None
+        if self.webhook:
+            self.bot.loop.create_task(self.webhook.close())
 
-    async def post_guild_count(self):
-        """Post the guild count to top.gg"""
-        if not self.token:
+    @commands.Cog.listener()
+    async def on_config_reload(self, cfg):
+        self.color = cfg.embed_color
+
+    def _on_webhook_vote(self, data: dict):
+        log.info("Received top.gg %s vote from user %s", data.get("type", "upvote"), data.get("user"))
+
+    async def _start_webhook(self):
+        """Start the vote webhook receiver if it is configured"""
+        if not self.webhook or self.webhook.running:
             return
-            
-        guild_count = len(self.bot.guilds)
-        url = f"{self.topgg_api}/bots/{self.bot.user.id}/stats"
-        payload = {"server_count": guild_count}
-        
+        self.webhook.bot_id = self.bot.user.id
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, headers=self.headers) as resp:
-                    if resp.status == 200:
-                        print(f"Posted server count to top.gg: {guild_count}")
-                    else:
-                        text = await resp.text()
-                        print(f"Failed to post server count to top.gg: {resp.status} - {text}")
+            await self.webhook.start()
+            log.info("top.gg vote webhook listening on %s:%s%s", self.webhook.host, self.webhook.port, self.webhook.path)
         except Exception as e:
-            print(f"Error posting server count to top.gg: {e}")
+            log.error("Failed to start top.gg vote webhook: %r", e)
+
+    def _vote_check_denied(self, user_id: int, guild) -> Optional[str]:
+        """Why a top.gg lookup is refused right now, or None; answers from the vote cache are free"""
+        if self.vote_cache.get(user_id) is not None:
+            return None
+        denied = get_limits().check("votes", user_id, getattr(guild, "id", None))
+        return denial_message("votes", *denied) if denied else None
+
+    async def has_voted(self, user_id: int) -> Optional[bool]:
+        """Return the user's vote status, answering from the vote cache when possible.
+
+        Falls back to GET /bots/{id}/check on a cache miss. Returns None if the API
+        answered with a non-200 status; network errors propagate to the caller.
+        """
+        cached = self.vote_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        url = f"{self.topgg_api}/bots/{self.bot.user.id}/check?userId={user_id}"
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, headers=self.headers) as resp:
+                if resp.status != 200:
+                    return None
+                data = await resp.json()
+
+        voted = bool(data.get("voted", 0))
+        if voted:
+            self.vote_cache.add_vote(user_id, API_VOTE_TTL)
+        elif self.webhook and self.webhook.running:
+            # new votes are pushed to us, so a negative answer can be trusted for a while
+            self.vote_cache.add_miss(user_id)
+        return voted
+
+    async def _stats_payload(self) -> dict:
+        """Build the /stats payload, including per-shard counts when sharded"""
+        aggregate = getattr(self.bot, "aggregate_stats", None)
+        if aggregate is not None:
+            # covers every cluster when running under the cluster launcher
+            stats = await aggregate()
+            guild_count = stats["guilds"]
+            shard_guilds = {sid: shard["guilds"] for sid, shard in stats.get("shards", {}).items()}
+        else:
+            guild_count = len(self.bot.guilds)
+            shard_guilds = {}
+            for g in self.bot.guilds:
+                shard_guilds[g.shard_id] = shard_guilds.get(g.shard_id, 0) + 1
+
+        payload = {"server_count": guild_count}
+        shard_count = getattr(self.bot, "shard_count", None) or 1
+        if shard_count > 1:
+            payload["shards"] = [shard_guilds.get(sid, 0) for sid in range(shard_count)]
+            payload["shard_count"] = shard_count
+        return payload
+
+    async def post_guild_count(self, force: bool = False) -> bool:
+        """Post the guild count to top.gg if it changed since the last successful post"""
+        # before the first READY the guild cache is still empty and would post a zero count
+        if not self.token or self.bot.user is None or not self.bot.is_ready():
+            return False
+        # with several clusters only the first one posts the fleet-wide numbers
+        if getattr(self.bot, "cluster_id", None) not in (None, 0):
+            return False
+
+        async with self._post_lock:
+            payload = await self._stats_payload()
+            if not force and payload == self._last_posted:
+                return False
 
-    async def update_stats_loop(self):
-        """Background task to update stats every 5 minutes"""
-        await self.bot.wait_until_ready()
-        while not self.bot.is_closed():
-            await self.post_guild_count()
-            await asyncio.sleep(300) 
+            url = f"{self.topgg_api}/bots/{self.bot.user.id}/stats"
+            self._last_post_at = time.monotonic()
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(url, json=payload, headers=self.headers) as resp:
+                        if resp.status == 200:
+                            self._last_posted = payload
+                            log.info("Posted server count to top.gg: %s", payload["server_count"])
+                            return True
+                        text = await resp.text()
+                        log.warning("Failed to post server count to top.gg: %s - %s", resp.status, text)
+            except Exception as e:
+                log.warning("Error posting server count to top.gg: %r", e)
+            return False
+
+    def schedule_post(self):
+        """Coalesce stats posts so at most one goes out per STATS_POST_WINDOW"""
+        if not self.token or self._post_handle is not None:
+            return
+        delay = max(0.0, self._last_post_at + STATS_POST_WINDOW - time.monotonic())
+        self._post_handle = self.bot.timers.call_later(delay, self._run_scheduled_post)
+
+    async def _run_scheduled_post(self):
+        self._post_handle = None
+        await self.post_guild_count()
+
+    async def update_stats(self):
+        """Periodic stats post, every 5 minutes"""
+        await self.post_guild_count()
+        self.vote_cache.prune()
 
     @commands.Cog.listener()
     async def on_ready(self):
-        """Start the stats updating task when the bot is ready"""
+        """Start the stats updating task and vote webhook when the bot is ready"""
+        await self._start_webhook()
         if not self.update_stats_task and self.token:
             # Start the background task for periodic updates
-            self.update_stats_task = self.bot.loop.create_task(self.update_stats_loop())
-            print("Started top.gg stats posting task")
+            self.update_stats_task = self.bot.timers.call_every(300, self.update_stats, delay=0)
+            log.info("Started top.gg stats posting task")
         elif not self.token:
-            print("No top.gg token found. Stats posting disabled.")
+            log.info("No top.gg token found. Stats posting disabled.")
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
         """Update stats when the bot joins a guild"""
-        await self.post_guild_count()
+        self.schedule_post()
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
         """Update stats when the bot leaves a guild"""
-        await self.post_guild_count()
+        self.schedule_post()
 
     @commands.slash_command(name="votes", description="Check your votes on top.gg")
     async def votes(self, inter: disnake.ApplicationCommandInteraction):
@@ -80,32 +207,29 @@ class TopGG(commands.Cog):
             )
             return
 
-        user_id = inter.author.id
-        url = f"{self.topgg_api}/bots/{self.bot.user.id}/check?userId={user_id}"
-        
+        denied = self._vote_check_denied(inter.author.id, inter.guild)
+        if denied:
+            await inter.response.send_message(denied, ephemeral=True)
+            return
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        voted = bool(data.get("voted", 0))
-                        
-                        if voted:
-                            await inter.response.send_message(
-                                "Thank you for voting for the bot! Your support is appreciated! ❤️",
-                                ephemeral=True
-                            )
-                        else:
-                            bot_id = self.bot.user.id
-                            await inter.response.send_message(
-                                f"You haven't voted for the bot yet! You can vote at https://top.gg/bot/{bot_id}/vote",
-                                ephemeral=True
-                            )
-                    else:
-                        await inter.response.send_message(
-                            "Failed to check vote status. Please try again later.",
-                            ephemeral=True
-                        )
+            voted = await self.has_voted(inter.author.id)
+            if voted is None:
+                await inter.response.send_message(
+                    "Failed to check vote status. Please try again later.",
+                    ephemeral=True
+                )
+            elif voted:
+                await inter.response.send_message(
+                    "Thank you for voting for the bot! Your support is appreciated! ❤️",
+                    ephemeral=True
+                )
+            else:
+                bot_id = self.bot.user.id
+                await inter.response.send_message(
+                    f"You haven't voted for the bot yet! You can vote at https://top.gg/bot/{bot_id}/vote",
+                    ephemeral=True
+                )
         except Exception as e:
             await inter.response.send_message(
                 f"An error occurred while checking your vote status: {e}",
@@ -118,7 +242,7 @@ class TopGG(commands.Cog):
             embed=disnake.Embed(
                 title="TopGG Commands",
                 description="Use:\n`>topgg votes` - Check if you have voted for the bot",
-                color=0x08bc6e8
+                color=self.color
             )
         )
     
@@ -130,52 +254,49 @@ class TopGG(commands.Cog):
                 embed=disnake.Embed(
                     title="Not Available",
                     description="This feature is not available as the bot is not configured with top.gg",
-                    color=0x08bc6e8
+                    color=self.color
                 )
             )
             return
 
-        user_id = ctx.author.id
-        url = f"{self.topgg_api}/bots/{self.bot.user.id}/check?userId={user_id}"
-        
+        denied = self._vote_check_denied(ctx.author.id, ctx.guild)
+        if denied:
+            await ctx.send(embed=disnake.Embed(title="Slow down", description=denied, color=self.color))
+            return
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        voted = bool(data.get("voted", 0))
-                        
-                        if voted:
-                            await ctx.send(
-                                embed=disnake.Embed(
-                                    title="Thanks for Voting!",
-                                    description="Thank you for voting for the bot! Your support is appreciated! ❤️",
-                                    color=0x08bc6e8
-                                )
-                            )
-                        else:
-                            bot_id = self.bot.user.id
-                            await ctx.send(
-                                embed=disnake.Embed(
-                                    title="Vote for the Bot",
-                                    description=f"You haven't voted for the bot yet! You can vote at https://top.gg/bot/{bot_id}/vote",
-                                    color=0x08bc6e8
-                                )
-                            )
-                    else:
-                        await ctx.send(
-                            embed=disnake.Embed(
-                                title="Error",
-                                description="Failed to check vote status. Please try again later.",
-                                color=0x08bc6e8
-                            )
-                        )
+            voted = await self.has_voted(ctx.author.id)
+            if voted is None:
+                await ctx.send(
+                    embed=disnake.Embed(
+                        title="Error",
+                        description="Failed to check vote status. Please try again later.",
+                        color=self.color
+                    )
+                )
+            elif voted:
+                await ctx.send(
+                    embed=disnake.Embed(
+                        title="Thanks for Voting!",
+                        description="Thank you for voting for the bot! Your support is appreciated! ❤️",
+                        color=self.color
+                    )
+                )
+            else:
+                bot_id = self.bot.user.id
+                await ctx.send(
+                    embed=disnake.Embed(
+                        title="Vote for the Bot",
+                        description=f"You haven't voted for the bot yet! You can vote at https://top.gg/bot/{bot_id}/vote",
+                        color=self.color
+                    )
+                )
         except Exception as e:
             await ctx.send(
                 embed=disnake.Embed(
                     title="Error",
                     description=f"An error occurred while checking your vote status: {e}",
-                    color=0x08bc6e8
+                    color=self.color
                 )
             )
 
@@ -184,8 +305,9 @@ def setup(bot):
     if TOPGG_TOKEN:
         cog = TopGG(bot)
         bot.add_cog(cog)
-        # Post server count immediately on cog load/reload
-        bot.loop.create_task(cog.post_guild_count())
-        print("TopGG cog loaded and posting server count")
+        # a reload posts right away; on boot on_ready does the first post
+        if bot.is_ready():
+            cog.schedule_post()
+        log.info("TopGG cog loaded and posting server count")
     else:
-        print("TopGG token not found. Cog not loaded.")
\ No newline at end of file
+        log.info("TopGG token not found. Cog not loaded.")
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Local stand-in for top.gg's vote webhook sender.
+
+Posts the same payload top.gg does so the embedded receiver in topgg.webhook
+can be exercised without a public URL:
+
+    python -m topgg.vote_sender --user 1234 --bot 5678
+"""
+import argparse
+import asyncio
+import os
+
+import aiohttp
+
+
+async def send_vote(url: str, auth: str, user_id: int, bot_id: int, vote_type: str = "test", weekend: bool = False) -> int:
+    payload = {
+        "bot": str(bot_id),
+        "user": str(user_id),
+        "type": vote_type,
+        "isWeekend": weekend,
+        "query": "",
+    }
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=payload, headers={"Authorization": auth}) as resp:
+            return resp.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a fake top.gg vote to the local webhook receiver")
+    parser.add_argument("--user", type=int, required=True, help="user id that 'voted'")
+    parser.add_argument("--bot", type=int, required=True, help="the bot's id, votes for other bots are refused")
+    parser.add_argument("--type", default="test", choices=("test", "upvote"))
+    parser.add_argument("--weekend", action="store_true")
+    parser.add_argument(
+        "--url",
+        default=f"http://127.0.0.1:{os.getenv('TOPGG_WEBHOOK_PORT', '5000')}{os.getenv('TOPGG_WEBHOOK_PATH', '/dblwebhook')}",
+    )
+    parser.add_argument("--auth", default=os.getenv("TOPGG_WEBHOOK_AUTH", ""))
+    args = parser.parse_args()
+
+    status = asyncio.run(send_vote(args.url, args.auth, args.user, args.bot, args.type, args.weekend))
+    print(f"{args.url} -> {status}")
+
+
+if __name__ == "__main__":
+    main()
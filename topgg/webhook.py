@@ -0,0 +1,122 @@
+import hmac
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+# top.gg lets a user vote again after 12 hours, so a vote is "live" for that long
+VOTE_TTL = 12 * 60 * 60
+# the API only says "voted in the last 12 hours", not when, so its yes is rechecked much sooner
+API_VOTE_TTL = 15 * 60
+# "Test" button votes from the top.gg dashboard (and topgg.vote_sender) only count briefly
+TEST_VOTE_TTL = 60
+# how long a "hasn't voted" answer from the API is trusted while the webhook is running
+MISS_TTL = 60
+
+
+class VoteCache:
+    """In-memory TTL cache of vote status keyed by user id"""
+
+    def __init__(self, ttl: float = VOTE_TTL, miss_ttl: float = MISS_TTL):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._entries: Dict[int, Tuple[bool, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[bool]:
+        """Return the cached vote status, or None on a miss / expired entry"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        voted, expires = entry
+        if expires <= time.monotonic():
+            self._entries.pop(user_id, None)
+            return None
+        return voted
+
+    def add_vote(self, user_id: int, ttl: Optional[float] = None):
+        """Cache a vote for ``ttl`` seconds, by default the full ``self.ttl`` of a vote just cast"""
+        self._entries[user_id] = (True, time.monotonic() + (self.ttl if ttl is None else ttl))
+
+    def add_miss(self, user_id: int):
+        # never let a stale "not voted" overwrite a live vote
+        if self.get(user_id):
+            return
+        self._entries[user_id] = (False, time.monotonic() + self.miss_ttl)
+
+    def prune(self) -> int:
+        now = time.monotonic()
+        expired = [uid for uid, (_, expires) in self._entries.items() if expires <= now]
+        for uid in expired:
+            del self._entries[uid]
+        return len(expired)
+
+
+class VoteWebhook:
+    """Small embedded aiohttp server that receives top.gg vote pushes into a VoteCache.
+
+    Once ``bot_id`` is set, votes for any other bot are refused.
+    """
+
+    def __init__(
+        self,
+        cache: VoteCache,
+        *,
+        auth: str,
+        host: str = "0.0.0.0",
+        port: int = 5000,
+        path: str = "/dblwebhook",
+        on_vote: Optional[Callable[[dict], None]] = None,
+        bot_id: Optional[int] = None,
+    ):
+        self.cache = cache
+        self.auth = auth
+        self.host = host
+        self.port = port
+        self.path = path
+        self.on_vote = on_vote
+        self.bot_id = bot_id
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_vote)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        try:
+            await site.start()
+        except Exception:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+
+    async def close(self):
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            await runner.cleanup()
+
+    async def _handle_vote(self, request: web.Request) -> web.Response:
+        given = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(given.encode(), self.auth.encode()):
+            return web.Response(status=401)
+        try:
+            data = await request.json()
+            user_id = int(data["user"])
+            bot_id = int(data["bot"])
+        except (KeyError, TypeError, ValueError):
+            return web.Response(status=400)
+        if self.bot_id is not None and bot_id != self.bot_id:
+            return web.Response(status=400)
+        self.cache.add_vote(user_id, TEST_VOTE_TTL if data.get("type") == "test" else None)
+        if self.on_vote:
+            self.on_vote(data)
+        return web.Response(status=204)
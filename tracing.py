@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+log = logging.getLogger("DopplerDeck.tracing")
+
+SERVICE_NAME = "dopplerdeck"
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Optional[dict] = None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """One sampled command invocation and the spans recorded under it"""
+
+    __slots__ = ("trace_id", "root", "spans")
+
+    def __init__(self, name: str, attributes: Optional[dict] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(name, None, attributes)
+        self.spans: List[Span] = [self.root]
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("dopplerdeck_trace", default=None)
+# the innermost open span; a ContextVar so tasks spawned under a span (asyncio.gather) each nest their own
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("dopplerdeck_span", default=None)
+
+
+class Tracer:
+    """Samples command traces, keeps the slowest recent ones and optionally
+    appends them to a file as OTLP/JSON (one ExportTraceServiceRequest per line).
+    """
+
+    def __init__(self, sample_rate: float = 0.0, keep: int = 100, export_path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.export_path = export_path or None
+        self.recent: Deque[Trace] = deque(maxlen=keep)
+        self._pending: List[Trace] = []
+
+    def configure(self, sample_rate: float, keep: int, export_path: Optional[str]):
+        self.sample_rate = sample_rate
+        self.export_path = export_path or None
+        if keep != self.recent.maxlen:
+            self.recent = deque(self.recent, maxlen=keep)
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Root span for a command; a no-op unless this invocation is sampled"""
+        if _current.get() is not None or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield None
+            return
+        tr = Trace(name, attributes)
+        token = _current.set(tr)
+        span_token = _current_span.set(tr.root)
+        try:
+            yield tr
+        except BaseException as exc:
+            tr.root.error = repr(exc)
+            raise
+        finally:
+            tr.root.end_ns = time.time_ns()
+            _current_span.reset(span_token)
+            _current.reset(token)
+            self.recent.append(tr)
+            if self.export_path:
+                self._pending.append(tr)
+
+    def slowest(self, n: int = 10) -> List[Trace]:
+        return sorted(self.recent, key=lambda t: t.duration_ms, reverse=True)[:n]
+
+    def take_pending(self) -> List[Trace]:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def export(self, traces: List[Trace]):
+        """Blocking file append, run it in a thread"""
+        if not traces or not self.export_path:
+            return
+        with open(self.export_path, "a", encoding="utf-8") as f:
+            for tr in traces:
+                f.write(json.dumps(_otlp(tr), separators=(",", ":")) + "\n")
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span of the current trace; costs one ContextVar lookup when nothing is sampled"""
+    tr = _current.get()
+    if tr is None:
+        yield None
+        return
+    parent = _current_span.get() or tr.root
+    sp = Span(name, parent.span_id, attributes)
+    tr.spans.append(sp)
+    token = _current_span.set(sp)
+    try:
+        yield sp
+    except BaseException as exc:
+        sp.error = repr(exc)
+        raise
+    finally:
+        sp.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def traced(name: str):
+    """Decorator: run the function (sync or async) inside ``span(name)``"""
+    def deco(func):
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+        else:
+            def wrapper(*args, **kwargs):
+                with span(name):
+                    return func(*args, **kwargs)
+        return functools.wraps(func)(wrapper)
+    return deco
+
+
+def _attr(key: str, value) -> dict:
+    if isinstance(value, bool):
+        v = {"boolValue": value}
+    elif isinstance(value, int):
+        v = {"intValue": str(value)}
+    elif isinstance(value, float):
+        v = {"doubleValue": value}
+    else:
+        v = {"stringValue": str(value)}
+    return {"key": key, "value": v}
+
+
+def _otlp(tr: Trace) -> Dict:
+    spans = []
+    for sp in tr.spans:
+        out = {
+            "traceId": tr.trace_id,
+            "spanId": sp.span_id,
+            "name": sp.name,
+            "kind": 2 if sp.parent_id is None else 1,  # SERVER for the command, INTERNAL for phases
+            "startTimeUnixNano": str(sp.start_ns),
+            "endTimeUnixNano": str(sp.end_ns or sp.start_ns),
+            "attributes": [_attr(k, v) for k, v in sp.attributes.items()],
+            "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1},
+        }
+        if sp.parent_id:
+            out["parentSpanId"] = sp.parent_id
+        spans.append(out)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attr("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "dopplerdeck.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """The process-wide Tracer"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
@@ -1,21 +1,52 @@
 import disnake
-from disnake.ext import commands, tasks
-from database import RestrictionDB
+from disnake.ext import commands
+from database import get_restriction_db
 import asyncio
 import logging
+import math
+from config import get_config
 
-try:
-    import tomllib as toml
-except ModuleNotFoundError:
-    import tomli as toml
-
-CONFIG_PATH = "config.toml"
 logger = logging.getLogger("DopplerDeck")
 
-def _load_color() -> int:
-    with open(CONFIG_PATH, "rb") as f:
-        cfg = toml.load(f)
-    return int(cfg.get("embed color", 0x8BC6E8))
+def _shard_guild_counts(bot) -> dict[int, int]:
+    counts = {sid: 0 for sid in getattr(bot, "shards", {})}
+    for g in getattr(bot, "guilds", []):
+        counts[g.shard_id] = counts.get(g.shard_id, 0) + 1
+    return counts
+
+async def _server_stats(bot) -> dict:
+    aggregate = getattr(bot, "aggregate_stats", None)
+    if aggregate is not None:
+        # summed across every cluster when running under the cluster launcher
+        return await aggregate()
+
+    guilds = getattr(bot, "guilds", [])
+    # prefering member count from discord
+    total_members = 0
+    for g in guilds:
+        count = getattr(g, "member_count", None)
+        if count is None:
+            # fall back = getting membercount from cache
+            try:
+                count = len(g.members)
+            except Exception:
+                count = 0
+        total_members += int(count)
+    shards = {sid: {"guilds": n} for sid, n in _shard_guild_counts(bot).items()}
+    return {"guilds": len(guilds), "members": total_members, "shards": shards}
+
+def _fmt_latency(latency: float) -> str:
+    # a shard without a heartbeat ACK yet reports inf, and no shards at all nan
+    return f"`{round(latency * 1000)}` ms" if math.isfinite(latency) else "`n/a`"
+
+def _ping_description(bot) -> str:
+    lines = [f"Latency: {_fmt_latency(bot.latency)}"]
+    latencies = getattr(bot, "latencies", [])
+    if len(latencies) > 1:
+        guilds = _shard_guild_counts(bot)
+        for sid, latency in latencies:
+            lines.append(f"Shard `{sid}`: {_fmt_latency(latency)} · {guilds.get(sid, 0):,} guilds")
+    return "\n".join(lines)
 
 class RestrictView(disnake.ui.View):
     def __init__(self, bot, guild_id, color):
@@ -23,7 +54,7 @@ class RestrictView(disnake.ui.View):
         self.bot = bot
         self.guild_id = guild_id
         self.color = color
-        self.db = RestrictionDB()
+        self.db = get_restriction_db(bot)
     
     @disnake.ui.select(
         placeholder="Choose an option...",
@@ -79,7 +110,7 @@ class VoiceChannelSelectView(disnake.ui.View):
         self.bot = bot
         self.guild_id = guild_id
         self.color = color
-        self.db = RestrictionDB()
+        self.db = get_restriction_db(bot)
         
         select = disnake.ui.Select(
             placeholder="Choose a voice channel...",
@@ -116,33 +147,41 @@ class VoiceChannelSelectView(disnake.ui.View):
 class Utils(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.color = _load_color()
-        self.db = RestrictionDB()
+        self.color = get_config().embed_color
         self.keep_alive_task = None
 
+    @property
+    def db(self):
+        # resolved on use, the cog loads while setup_hook is still connecting the database
+        return get_restriction_db(self.bot)
+
     def cog_unload(self):
         if self.keep_alive_task:
             self.keep_alive_task.cancel()
 
+    @commands.Cog.listener()
+    async def on_config_reload(self, cfg):
+        self.color = cfg.embed_color
+
     @commands.Cog.listener()
     async def on_ready(self):
         if not self.keep_alive_task:
-            self.keep_alive_heartbeat.start()
+            self.keep_alive_task = self.bot.timers.call_every(40, self.keep_alive_heartbeat)
             logger.info("Started keep-alive heartbeat task")
 
-    @tasks.loop(seconds=40)
     async def keep_alive_heartbeat(self):
         """Send a heartbeat to keep the connection alive and prevent timeouts"""
         try:
-            await self.bot.change_presence(activity=self.bot.activity, status=self.bot.status)
+            refresh = getattr(self.bot, "_refresh_presence", None)
+            if refresh:
+                # re-send each shard's own label instead of one activity for every shard
+                await refresh(force=True)
+            else:
+                await self.bot.change_presence(activity=self.bot.activity, status=self.bot.status)
             logger.debug("Sent keep-alive heartbeat")
         except Exception as e:
             logger.warning(f"Error in keep-alive heartbeat: {e}")
 
-    @keep_alive_heartbeat.before_loop
-    async def before_keep_alive(self):
-        await self.bot.wait_until_ready()
-
     @commands.group(name="utils", invoke_without_command=True)
     async def utils_group(self, ctx):
         ms = round(self.bot.latency * 1000)
@@ -150,8 +189,7 @@ class Utils(commands.Cog):
 
     @utils_group.command(name="ping")
     async def ping_prefix(self, ctx):
-        ms = round(self.bot.latency * 1000)
-        await ctx.send(embed=disnake.Embed(title="Pong!", description=f"Latency: `{ms}` ms", color=self.color))
+        await ctx.send(embed=disnake.Embed(title="Pong!", description=_ping_description(self.bot), color=self.color))
 
     @utils_group.command(name="restrict")
     async def restrict_prefix(self, ctx):
@@ -207,22 +245,19 @@ class Utils(commands.Cog):
 
     @utils_group.command(name="servers")
     async def servers_prefix(self, ctx):
-        guilds = getattr(self.bot, "guilds", [])
-        guild_count = len(guilds)
+        stats = await _server_stats(self.bot)
+        guild_count = stats["guilds"]
+        total_members = stats["members"]
 
-        total_members = 0
-        for g in guilds:
-            count = getattr(g, "member_count", None)
-            if count is None:
-                try:
-                    count = len(g.members)
-                except Exception:
-                    count = 0
-            total_members += count
+        description = f"Servers: **{guild_count}**\nTotal Members: **{total_members}**"
+        shards = stats.get("shards", {})
+        if len(shards) > 1:
+            description += f"\nShards: **{len(shards)}**\n"
+            description += "\n".join(f"Shard `{sid}`: **{shard['guilds']}** servers" for sid, shard in sorted(shards.items()))
 
         embed = disnake.Embed(
             title="Server Stats",
-            description=f"Servers: **{guild_count}**\nTotal Members: **{total_members}**",
+            description=description,
             color=self.color
         )
         await ctx.send(embed=embed)
@@ -233,8 +268,7 @@ class Utils(commands.Cog):
 
     @utils_slash.sub_command(name="ping")
     async def ping_slash(self, inter: disnake.ApplicationCommandInteraction):
-        ms = round(self.bot.latency * 1000)
-        await inter.response.send_message(embed=disnake.Embed(title="Pong!", description=f"Latency: `{ms}` ms", color=self.color))
+        await inter.response.send_message(embed=disnake.Embed(title="Pong!", description=_ping_description(self.bot), color=self.color))
 
     @utils_slash.sub_command(name="restrict", description="Restrict bot to specific voice channel")
     async def restrict_slash(self, inter: disnake.ApplicationCommandInteraction):
@@ -303,24 +337,18 @@ class Utils(commands.Cog):
 
     @utils_slash.sub_command(name="servers", description="Show how many servers the bot is in and the total members across them")
     async def servers_slash(self, inter: disnake.ApplicationCommandInteraction):
-        guilds = getattr(self.bot, "guilds", [])
-        guild_count = len(guilds)
-
-        # prefering member count from discord
-        total_members = 0
-        for g in guilds:
-            count = getattr(g, "member_count", None)
-            if count is None:
-                # fall back = getting membercount from cache
-                try:
-                    count = len(g.members)
-                except Exception:
-                    count = 0
-            total_members += int(count) # no i cant code for shit
+        stats = await _server_stats(self.bot)
+        guild_count = stats["guilds"]
+        total_members = stats["members"]
 
         embed = disnake.Embed(title="Servers & Members", color=self.color)
         embed.add_field(name="Servers", value=f"{guild_count:,}")
         embed.add_field(name="Total members", value=f"{total_members:,}")
+        shards = stats.get("shards", {})
+        if len(shards) > 1:
+            embed.add_field(name="Shards", value=f"{len(shards):,}")
+            per_shard = "\n".join(f"`{sid}`: {shard['guilds']:,}" for sid, shard in sorted(shards.items()))
+            embed.add_field(name="Servers per shard", value=per_shard[:1024], inline=False)
         await inter.response.send_message(embed=embed)
 
 